@@ -6,7 +6,7 @@ from models import db, User
 from auth import auth
 from admin import admin
 from google_auth import simple_google_auth  # Fixed Google auth import
-from security import add_security_headers
+from security import add_security_headers, flush_security_events, CONTENT_SECURITY_POLICY
 from config import Config
 import os
 import logging
@@ -183,37 +183,27 @@ def create_app():
     def inject_accessibility():
         if current_user.is_authenticated:
             user_id = current_user.id
-            logger.info(f"Context processor: Loading settings for user {user_id}")
+            logger.info("Context processor: Loading settings for user %s", user_id)
             accessibility_settings = load_user_settings(user_id)
-            logger.info(f"Context processor: Loaded settings: {accessibility_settings}")
+            logger.info("Context processor: Loaded settings: %s", accessibility_settings)
             accessibility_css = get_accessibility_css(accessibility_settings)
             
-            def get_text(key):
-                text = get_language_text(accessibility_settings, key)
-                logger.debug(f"Context processor: get_text('{key}') = '{text}' (language: {accessibility_settings.get('language', 'en')})")
-                return text
-                
             return {
                 'accessibility_settings': accessibility_settings,
                 'accessibility_css': accessibility_css,
-                'get_text': get_text,
+                'get_text': make_translator(accessibility_settings),
                 'csrf_token': generate_csrf_token
             }
         else:
             # Default settings for non-authenticated users
             logger.info("Context processor: Using default settings for non-authenticated user")
-            default_settings = DEFAULT_SETTINGS.copy()
+            default_settings = DEFAULT_SETTINGS_VIEW
             accessibility_css = get_accessibility_css(default_settings)
             
-            def get_text(key):
-                text = get_language_text(default_settings, key)
-                logger.debug(f"Context processor: get_text('{key}') = '{text}' (default language)")
-                return text
-                
             return {
                 'accessibility_settings': default_settings,
                 'accessibility_css': accessibility_css,
-                'get_text': get_text,
+                'get_text': make_translator(default_settings),
                 'csrf_token': generate_csrf_token
             }
     
@@ -235,6 +225,9 @@ def create_app():
     # Add security headers to all responses
     app.after_request(add_security_headers)
     
+    # Write each request's audit events in one batch
+    app.teardown_request(flush_security_events)
+    
     # Create upload folder if it doesn't exist
     upload_folder = os.path.join(app.root_path, app.config['UPLOAD_FOLDER'])
     if not os.path.exists(upload_folder):
@@ -266,15 +259,7 @@ def create_app():
     @app.after_request
     def after_request(response):
         # Allow Leaflet CDN and other necessary resources
-        csp = (
-            "default-src 'self'; "
-            "script-src 'self' 'unsafe-inline' https://unpkg.com; "
-            "style-src 'self' 'unsafe-inline' https://unpkg.com; "
-            "connect-src 'self' https://*.tile.openstreetmap.org; "
-            "img-src 'self' data: https://*.tile.openstreetmap.org https://unpkg.com; "
-            "font-src 'self' data:"
-        )
-        response.headers['Content-Security-Policy'] = csp
+        response.headers['Content-Security-Policy'] = CONTENT_SECURITY_POLICY
         return response
     
     @app.route('/home')
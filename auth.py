@@ -229,9 +229,7 @@ def create_test_2fa_user():
     
     try:
         from email_service import EmailService
-        user, two_fa = EmailService.create_test_user_with_2fa()
-        
-        backup_codes = two_fa.backup_codes.split(',')
+        user, two_fa, backup_codes = EmailService.create_test_user_with_2fa()
         
         return f"""
         <h1>Test 2FA User Created</h1>
@@ -381,6 +379,8 @@ def change_password():
             flash('Your password has been changed successfully!', 'success')
             return redirect(url_for('auth.profile'))
         else:
+            # Persist the failed-attempt counter / lockout check_password just updated
+            db.session.commit()
             flash('Current password is incorrect.', 'error')
             log_security_event(f'Failed password change attempt: {current_user.username}', success=False)
 
@@ -559,8 +559,8 @@ def reset_password(token):
         return redirect(url_for('home'))
     
     # Find user with this token
-    user = User.query.filter_by(password_reset_token=token).first()
-    if not user or not user.verify_reset_token(token):
+    user = User.find_by_reset_token(token)
+    if not user:
         flash('Invalid or expired reset token. Please request a new password reset.', 'error')
         return redirect(url_for('auth.forgot_password'))
     
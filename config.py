@@ -46,9 +46,14 @@ class Config:
     # Flask-SQLAlchemy configuration
     SQLALCHEMY_DATABASE_URI = f'mysql+pymysql://{MYSQL_USER}:{encoded_password}@{MYSQL_HOST}/{MYSQL_DATABASE}'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Keep a warm pool of MySQL connections so requests skip the TCP + auth handshake.
+    # Up to pool_size + max_overflow connections per process: keep workers * 30 under max_connections
     SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
         'pool_pre_ping': True,
-        'pool_recycle': 300,
+        # pre_ping catches dropped connections; recycle only well inside wait_timeout
+        'pool_recycle': 1800,
     }
     
     # FIXED: Google OAuth configuration with validation
@@ -67,6 +72,9 @@ class Config:
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
     
     # Security config
+    # Shared rate-limit store for multi-worker deployments; unset keeps per-process counts.
+    # Needs the optional `redis` package and Redis 4.0+ (multi-field HSET in the token-bucket script)
+    RATE_LIMIT_REDIS_URL = os.environ.get('REDIS_URL')
     WTF_CSRF_ENABLED = True
     WTF_CSRF_TIME_LIMIT = None
     
@@ -282,51 +282,42 @@ The SilverSage Team
         except Exception as e:
             return False, f"Email configuration error: {str(e)}"
         
-    @staticmethod
-    def generate_test_backup_codes():
-        """Generate test backup codes for development/testing"""
-        import secrets
-        
-        # Generate 10 backup codes
-        backup_codes = []
-        for i in range(10):
-            code = f"{secrets.randbelow(100000000):08d}"
-            backup_codes.append(code)
-        
-        return backup_codes
-    
     @staticmethod
     def create_test_user_with_2fa(username="testuser", email="test@example.com"):
-        """Create a test user with 2FA enabled for testing backup codes"""
+        """Create a test user with 2FA enabled for testing backup codes
+        Returns (user, two_fa, backup_codes) - codes are only stored hashed"""
         from models import User, TwoFactorAuth, db
-        import secrets
         
-        # Check if user already exists
+        # Check if user already exists - issue fresh codes since old ones can't be shown
         existing_user = User.query.filter_by(email=email).first()
-        if existing_user:
-            return existing_user, existing_user.two_factor_auth
+        if existing_user and existing_user.two_factor_auth:
+            two_fa = existing_user.two_factor_auth
+            backup_codes = two_fa.generate_backup_codes()
+            db.session.commit()
+            return existing_user, two_fa, backup_codes
         
-        # Create test user
-        user = User(
-            username=username,
-            email=email,
-            first_name="Test",
-            last_name="User",
-            is_active=True
-        )
-        user.set_password("TestPassword123!")
-        
-        db.session.add(user)
-        db.session.flush()  # Get user ID
+        if existing_user:
+            user = existing_user
+        else:
+            # Create test user
+            user = User(
+                username=username,
+                email=email,
+                first_name="Test",
+                last_name="User",
+                is_active=True
+            )
+            user.set_password("TestPassword123!")
+            
+            db.session.add(user)
+            db.session.flush()  # Get user ID
         
         # Create 2FA setup
-        backup_codes = EmailService.generate_test_backup_codes()
-        
         two_fa = TwoFactorAuth(
             user_id=user.id,
-            is_enabled=True,
-            backup_codes=','.join(backup_codes)
+            is_enabled=True
         )
+        backup_codes = two_fa.generate_backup_codes()
         
         db.session.add(two_fa)
         db.session.commit()
@@ -335,4 +326,4 @@ The SilverSage Team
         print(f"Password: TestPassword123!")
         print(f"Backup codes: {backup_codes}")
         
-        return user, two_fa
\ No newline at end of file
+        return user, two_fa, backup_codes
\ No newline at end of file
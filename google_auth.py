@@ -44,6 +44,9 @@ OAUTH_SCOPES = [
     'https://www.googleapis.com/auth/gmail.send'  # Added Gmail send permission
 ]
 
+# Joined once at import - the scope string never changes between requests
+_OAUTH_SCOPE_STR = ' '.join(OAUTH_SCOPES)
+
 # Manual endpoint configuration as fallback
 MANUAL_GOOGLE_ENDPOINTS = {
     'authorization_endpoint': 'https://accounts.google.com/o/oauth2/v2/auth',
@@ -52,6 +55,8 @@ MANUAL_GOOGLE_ENDPOINTS = {
     'issuer': 'https://accounts.google.com'
 }
 
+_DEFAULT_USERINFO = MANUAL_GOOGLE_ENDPOINTS['userinfo_endpoint']
+
 def get_google_provider_cfg(max_retries=3, timeout=15):
     """Get Google's OAuth configuration with fallback to manual endpoints"""
     
@@ -140,7 +145,7 @@ def google_login():
         params = {
             'client_id': GOOGLE_CLIENT_ID,
             'redirect_uri': redirect_uri,
-            'scope': ' '.join(OAUTH_SCOPES),  # Updated with Gmail scope
+            'scope': _OAUTH_SCOPE_STR,  # Updated with Gmail scope
             'response_type': 'code',
             'state': state,
             'access_type': 'offline',  # Important for refresh tokens
@@ -210,7 +215,7 @@ def google_callback():
             return redirect(url_for('auth.login'))
         
         # Get user info
-        userinfo_endpoint = google_provider_cfg.get("userinfo_endpoint", MANUAL_GOOGLE_ENDPOINTS['userinfo_endpoint'])
+        userinfo_endpoint = google_provider_cfg.get("userinfo_endpoint", _DEFAULT_USERINFO)
         
         headers = {'Authorization': f'Bearer {tokens["access_token"]}'}
         userinfo_response = requests.get(userinfo_endpoint, headers=headers, timeout=10)
@@ -265,7 +270,8 @@ def google_callback():
                 email_verified=True
             )
             
-            user.set_password(secrets.token_urlsafe(32))
+            # Google-only account: no password to hash
+            user.set_unusable_password()
             
             db.session.add(user)
             db.session.commit()
@@ -413,10 +419,6 @@ def enable_2fa():
         two_fa.temp_code = test_code
         two_fa.temp_code_expires = datetime.utcnow() + timedelta(minutes=10)
         
-        # Generate backup codes
-        backup_codes = [f"{secrets.randbelow(100000000):08d}" for _ in range(10)]
-        two_fa.backup_codes = ','.join(backup_codes)
-        
         db.session.commit()
         
         # Use universal EmailService instead of Google-specific sending
@@ -447,10 +449,11 @@ def verify_2fa_setup():
         two_fa = current_user.two_factor_auth
         
         if two_fa and two_fa.verify_temp_code(code):
-            # Enable 2FA
+            # Enable 2FA - backup codes are only stored hashed, so generate them now
             two_fa.is_enabled = True
             two_fa.temp_code = None
             two_fa.temp_code_expires = None
+            backup_codes = two_fa.generate_backup_codes()
             db.session.commit()
             
             # Clear session
@@ -459,8 +462,7 @@ def verify_2fa_setup():
             log_security_event(f'2FA enabled for user: {current_user.username}')
             flash('Two-factor authentication has been successfully enabled!', 'success')
             
-            # Show backup codes
-            backup_codes = two_fa.backup_codes.split(',')
+            # Show backup codes (the only time they are available in plaintext)
             return render_template('auth/2fa_enabled.html', backup_codes=backup_codes)
         else:
             flash('Invalid or expired verification code.', 'error')
@@ -495,6 +497,8 @@ def disable_2fa():
             flash('Two-factor authentication has been disabled. Your account is now less secure.', 'warning')
             return redirect(url_for('auth.security_settings'))
         else:
+            # Persist the failed-attempt counter / lockout check_password just updated
+            db.session.commit()
             flash('Incorrect password.', 'error')
             log_security_event(f'Failed 2FA disable attempt: {current_user.username}', success=False)
     
@@ -511,8 +515,7 @@ def regenerate_backup_codes():
     two_fa = current_user.two_factor_auth
     if two_fa:
         # Generate new backup codes
-        backup_codes = [f"{secrets.randbelow(100000000):08d}" for _ in range(10)]
-        two_fa.backup_codes = ','.join(backup_codes)
+        backup_codes = two_fa.generate_backup_codes()
         db.session.commit()
         
         log_security_event(f'2FA backup codes regenerated: {current_user.username}')
@@ -1,7 +1,7 @@
 """
 Database migration script to handle schema differences
 """
-import pymysql
+import re
 from config import Config
 from urllib.parse import unquote
 import sys
@@ -10,7 +10,6 @@ import sys
 config = Config()
 
 # Parse the connection details
-import re
 match = re.search(r'mysql\+pymysql://(.+):(.+)@(.+)/(.+)', config.SQLALCHEMY_DATABASE_URI)
 if match:
     user = match.group(1)
@@ -18,6 +17,67 @@ if match:
     host = match.group(3)
     database = match.group(4)
 
+def _batch_alter(cursor, table, clauses):
+    """Apply several ALTER TABLE clauses as one statement (one table rebuild).
+    Falls back to one statement per clause if the combined ALTER fails."""
+    if not clauses:
+        return
+    try:
+        cursor.execute(f"ALTER TABLE {table} " + ", ".join(clauses))
+    except Exception as e:
+        print(f"⚠️  Batched ALTER failed ({str(e)}), retrying one clause at a time")
+        for clause in clauses:
+            try:
+                cursor.execute(f"ALTER TABLE {table} {clause}")
+            except Exception as e:
+                print(f"⚠️  Could not apply '{clause}': {str(e)}")
+
+def _run_script(cursor, statements):
+    """Send several statements to the server in one round-trip.
+    Returns False if any statement in the batch failed."""
+    try:
+        cursor.execute(";\n".join(statements) + ";")
+        while cursor.nextset():
+            pass
+        return True
+    except Exception as e:
+        print(f"⚠️  Batched script failed ({str(e)}), retrying statement by statement")
+        return False
+
+def _run_statements(cursor, statements):
+    """Execute statements one at a time, reporting failures instead of aborting
+    so one bad CREATE doesn't stop the rest of the migration."""
+    for statement in statements:
+        try:
+            cursor.execute(statement)
+        except Exception as e:
+            print(f"⚠️  Could not run '{' '.join(statement.split())[:60]}...': {str(e)}")
+
+def _copy_passwords_in_chunks(connection, cursor, old_col, chunk_size=10000):
+    """Move legacy hex salt+hash values from old_col into password_salt/password_hash
+    in primary-key windows. Each window is its own small transaction so the undo log stays bounded.
+    Values that aren't 64 hex chars of salt followed by 64 of hash are left untouched."""
+    cursor.execute("SELECT MIN(id) AS min_id, MAX(id) AS max_id FROM users")
+    bounds = cursor.fetchone()
+    if bounds['min_id'] is None:
+        return
+    stmt = (
+        f"UPDATE users SET password_salt = UNHEX(LEFT(`{old_col}`, 64)), "
+        f"password_hash = UNHEX(SUBSTRING(`{old_col}`, 65)) "
+        f"WHERE id BETWEEN %s AND %s AND password_hash IS NULL "
+        f"AND `{old_col}` REGEXP '^[0-9a-fA-F]{{128}}$'"
+    )
+    for lo in range(bounds['min_id'], bounds['max_id'] + 1, chunk_size):
+        cursor.execute(stmt, (lo, lo + chunk_size - 1))
+        connection.commit()
+
+# Rows left without a hash get random bytes and a NULL salt: an unusable password
+# (see models._hash_matches), so those users must reset it before logging in
+_MARK_UNUSABLE_PASSWORDS_SQL = (
+    "UPDATE users SET password_salt = NULL, password_hash = UNHEX(SHA2(UUID(), 256)) "
+    "WHERE password_hash IS NULL"
+)
+
 print("🔧 Database Migration Tool")
 print("="*50)
 print(f"Host: {host}")
@@ -33,145 +93,191 @@ print("4. Exit without changes")
 
 choice = input("\nEnter your choice (1-4): ")
 
-try:
-    # Connect to MySQL
-    connection = pymysql.connect(
-        host=host,
-        user=user,
-        password=password,
-        database=database,
-        cursorclass=pymysql.cursors.DictCursor
-    )
-    
-    with connection.cursor() as cursor:
-        if choice == '1':
-            # Create new database
-            print("\n📦 Creating new database 'elderly_app'...")
-            
-            # First, connect without specifying database
-            conn_no_db = pymysql.connect(
-                host=host,
-                user=user,
-                password=password
-            )
-            
-            with conn_no_db.cursor() as cursor_no_db:
-                cursor_no_db.execute("CREATE DATABASE IF NOT EXISTS elderly_app")
-                cursor_no_db.execute(f"GRANT ALL PRIVILEGES ON elderly_app.* TO '{user}'@'%'")
-                cursor_no_db.execute("FLUSH PRIVILEGES")
-            
-            conn_no_db.close()
-            
-            print("✅ Database 'elderly_app' created successfully!")
-            print("\n📝 Update your .env file:")
-            print("MYSQL_DATABASE=elderly_app")
-            print("\nThen restart your Flask application.")
-            
-        elif choice == '2':
-            # Add missing columns
-            print("\n🔨 Adding missing columns to existing users table...")
-            
-            # Get existing columns
-            cursor.execute("DESCRIBE users")
-            existing_columns = [col['Field'] for col in cursor.fetchall()]
-            
-            # Define required columns with their SQL definitions
-            required_columns = {
-                'password_hash': 'VARCHAR(256)',
-                'first_name': 'VARCHAR(50)',
-                'last_name': 'VARCHAR(50)',
-                'age': 'INT',
-                'contact_number': 'VARCHAR(20)',
-                'profile_picture': 'VARCHAR(200) DEFAULT "default.png"',
-                'is_admin': 'BOOLEAN DEFAULT FALSE',
-                'is_active': 'BOOLEAN DEFAULT TRUE',
-                'failed_login_attempts': 'INT DEFAULT 0',
-                'last_failed_login': 'DATETIME',
-                'account_locked_until': 'DATETIME',
-                'password_reset_token': 'VARCHAR(100)',
-                'password_reset_expiry': 'DATETIME',
-                'updated_at': 'DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP',
-                'last_login': 'DATETIME'
-            }
-            
-            # Check if there's a password column to migrate
-            cursor.execute("SHOW COLUMNS FROM users LIKE '%pass%'")
-            password_cols = cursor.fetchall()
-            old_password_col = None
-            if password_cols:
-                old_password_col = password_cols[0]['Field']
-                print(f"Found existing password column: {old_password_col}")
-            
-            # Add missing columns
-            for col_name, col_def in required_columns.items():
-                if col_name not in existing_columns:
-                    try:
-                        print(f"Adding column: {col_name}")
-                        cursor.execute(f"ALTER TABLE users ADD COLUMN {col_name} {col_def}")
-                    except Exception as e:
-                        print(f"⚠️  Could not add {col_name}: {str(e)}")
-            
-            # If there's an old password column, offer to migrate
-            if old_password_col and old_password_col != 'password_hash':
-                migrate_passwords = input(f"\nMigrate passwords from '{old_password_col}' to 'password_hash'? (y/n): ")
-                if migrate_passwords.lower() == 'y':
-                    cursor.execute(f"UPDATE users SET password_hash = {old_password_col} WHERE password_hash IS NULL")
+if choice in ('1', '2', '3'):
+    # The MySQL driver is only needed once we know we're touching the database
+    import pymysql
+    from pymysql.constants import CLIENT
+    from simple_migration import add_display_name_column, split_password_hashes
+        
+    try:
+        # Connect to MySQL
+        connection = pymysql.connect(
+            host=host,
+            user=user,
+            password=password,
+            database=database,
+            cursorclass=pymysql.cursors.DictCursor,
+            client_flag=CLIENT.MULTI_STATEMENTS,
+            # Metadata reads don't need an InnoDB snapshot; DDL commits implicitly anyway
+            autocommit=True
+        )
+        
+        with connection.cursor() as cursor:
+            if choice == '1':
+                # Create new database
+                print("\n📦 Creating new database 'elderly_app'...")
+                
+                # Reuse the open connection - CREATE DATABASE doesn't depend on the selected schema
+                cursor.execute("CREATE DATABASE IF NOT EXISTS elderly_app")
+                cursor.execute(f"GRANT ALL PRIVILEGES ON elderly_app.* TO '{user}'@'%'")
+                cursor.execute("FLUSH PRIVILEGES")
+                
+                print("✅ Database 'elderly_app' created successfully!")
+                print("\n📝 Update your .env file:")
+                print("MYSQL_DATABASE=elderly_app")
+                print("\nThen restart your Flask application.")
+                
+            elif choice == '2':
+                # Add missing columns
+                print("\n🔨 Adding missing columns to existing users table...")
+                
+                # Get existing columns with one information_schema read
+                cursor.execute("""
+                    SELECT COLUMN_NAME AS column_name
+                    FROM information_schema.columns
+                    WHERE table_schema = %s AND table_name = 'users'
+                    ORDER BY ORDINAL_POSITION
+                """, (database,))
+                column_names = [col['column_name'] for col in cursor.fetchall()]
+                existing_columns = set(column_names)
+                
+                # Define required columns with their SQL definitions
+                required_columns = {
+                    'password_hash': 'VARBINARY(32)',
+                    'password_salt': 'VARBINARY(32)',
+                    'first_name': 'VARCHAR(50)',
+                    'last_name': 'VARCHAR(50)',
+                    'age': 'INT',
+                    'contact_number': 'VARCHAR(20)',
+                    'profile_picture': 'VARCHAR(200) DEFAULT "default.png"',
+                    'is_admin': 'BOOLEAN DEFAULT FALSE',
+                    'is_active': 'BOOLEAN DEFAULT TRUE',
+                    'failed_login_attempts': 'INT DEFAULT 0',
+                    'last_failed_login': 'DATETIME',
+                    'account_locked_until': 'DATETIME',
+                    'password_reset_token': 'VARCHAR(100)',
+                    'password_reset_expiry': 'DATETIME',
+                    'updated_at': 'DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP',
+                    'last_login': 'DATETIME'
+                }
+                
+                # Indexes for the hot lookup paths (reset token, lockout, login)
+                required_indexes = {
+                    'ix_users_password_reset_token': '(password_reset_token)',
+                    'ix_users_account_locked_until': '(account_locked_until)'
+                }
+                # email is already unique-indexed, so this composite index only cost writes
+                obsolete_indexes = ('ix_user_email_active',)
+                cursor.execute("SHOW INDEX FROM users")
+                existing_indexes = {idx['Key_name'] for idx in cursor.fetchall()}
+                
+                # Check if there's a password column to migrate
+                password_cols = [col for col in column_names
+                                 if 'pass' in col.lower() and col not in ('password_hash', 'password_salt')]
+                old_password_col = None
+                if password_cols:
+                    old_password_col = password_cols[0]
+                    print(f"Found existing password column: {old_password_col}")
+                
+                # Add missing columns in a single ALTER so the table is rebuilt once
+                missing = [(n, d) for n, d in required_columns.items() if n not in existing_columns]
+                for col_name, _ in missing:
+                    print(f"Adding column: {col_name}")
+                alter_clauses = [f"ADD COLUMN {n} {d}" for n, d in missing]
+                for idx_name, idx_cols in required_indexes.items():
+                    if idx_name not in existing_indexes:
+                        print(f"Adding index: {idx_name}")
+                        alter_clauses.append(f"ADD INDEX {idx_name} {idx_cols}")
+                for idx_name in obsolete_indexes:
+                    if idx_name in existing_indexes:
+                        print(f"Dropping index: {idx_name}")
+                        alter_clauses.append(f"DROP INDEX {idx_name}")
+                
+                # If there's an old password column, offer to migrate
+                migrate_from = None
+                if old_password_col and old_password_col != 'password_hash' and old_password_col in existing_columns:
+                    migrate_passwords = input(f"\nMigrate hex salt+hash passwords from '{old_password_col}' to 'password_salt'/'password_hash'? (y/n): ")
+                    if migrate_passwords.lower() == 'y':
+                        migrate_from = old_password_col
+                
+                # Create other required tables
+                print("\n📋 Creating additional tables...")
+                
+                table_statements = [
+                    # Password history table
+                    """
+                    CREATE TABLE IF NOT EXISTS password_history (
+                        id INT AUTO_INCREMENT PRIMARY KEY,
+                        user_id INT,
+                        password_hash VARBINARY(32),
+                        password_salt VARBINARY(32),
+                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        INDEX ix_pwhist_user_created (user_id, created_at),
+                        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+                    )
+                    """,
+                    # Audit log table
+                    """
+                    CREATE TABLE IF NOT EXISTS audit_logs (
+                        id INT AUTO_INCREMENT PRIMARY KEY,
+                        user_id INT,
+                        action VARCHAR(100) NOT NULL,
+                        ip_address VARCHAR(45),
+                        user_agent VARCHAR(200),
+                        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        success BOOLEAN DEFAULT TRUE,
+                        details TEXT,
+                        INDEX ix_audit_user_ts (user_id, timestamp),
+                        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL
+                    )
+                    """
+                ]
+                
+                # Ship the whole migration in one round-trip
+                script = []
+                if alter_clauses:
+                    script.append("ALTER TABLE users " + ", ".join(alter_clauses))
+                script.extend(table_statements)
+                
+                if not _run_script(cursor, script):
+                    _batch_alter(cursor, 'users', alter_clauses)
+                    _run_statements(cursor, table_statements)
+                
+                # Copy passwords after the DDL so password_hash is guaranteed to exist
+                if migrate_from:
+                    _copy_passwords_in_chunks(connection, cursor, migrate_from)
                     print("✅ Passwords migrated")
-            
-            # Create other required tables
-            print("\n📋 Creating additional tables...")
-            
-            # Password history table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS password_history (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    user_id INT,
-                    password_hash VARCHAR(256),
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-                )
-            """)
-            
-            # Audit log table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS audit_logs (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    user_id INT,
-                    action VARCHAR(100) NOT NULL,
-                    ip_address VARCHAR(45),
-                    user_agent VARCHAR(200),
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    success BOOLEAN DEFAULT TRUE,
-                    details TEXT,
-                    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL
-                )
-            """)
-            
-            connection.commit()
-            print("✅ Schema migration completed!")
-            
-        elif choice == '3':
-            # Drop and recreate
-            confirm = input("\n⚠️  WARNING: This will DELETE ALL DATA! Type 'DELETE' to confirm: ")
-            if confirm == 'DELETE':
-                print("\n🗑️  Dropping existing tables...")
-                cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
-                cursor.execute("DROP TABLE IF EXISTS audit_logs")
-                cursor.execute("DROP TABLE IF EXISTS password_history")
-                cursor.execute("DROP TABLE IF EXISTS users")
-                cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+                
+                unusable = cursor.execute(_MARK_UNUSABLE_PASSWORDS_SQL)
+                if unusable:
+                    print(f"⚠️  {unusable} users have no convertible password and must reset it")
+                
+                # Shared with simple_migration.py so either script leaves the same schema
+                add_display_name_column(cursor)
+                split_password_hashes(cursor)
+                
                 connection.commit()
-                print("✅ Tables dropped. Restart Flask app to create new tables.")
-            else:
-                print("❌ Operation cancelled.")
-                
-        else:
-            print("\n👋 Exiting without changes.")
-            
-except Exception as e:
-    print(f"\n❌ Error: {str(e)}")
-finally:
-    if 'connection' in locals():
-        connection.close()
+                print("✅ Schema migration completed!")
+                
+            elif choice == '3':
+                # Drop and recreate
+                confirm = input("\n⚠️  WARNING: This will DELETE ALL DATA! Type 'DELETE' to confirm: ")
+                if confirm == 'DELETE':
+                    print("\n🗑️  Dropping existing tables...")
+                    cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+                    cursor.execute("DROP TABLE IF EXISTS audit_logs, password_history, users")
+                    cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+                    connection.commit()
+                    print("✅ Tables dropped. Restart Flask app to create new tables.")
+                else:
+                    print("❌ Operation cancelled.")
+                    
+    except Exception as e:
+        print(f"\n❌ Error: {str(e)}")
+    finally:
+        if 'connection' in locals():
+            connection.close()
+else:
+    print("\n👋 Exiting without changes.")
 
 print("\n✅ Migration script completed!")
\ No newline at end of file
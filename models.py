@@ -1,14 +1,39 @@
 # Updated models.py - Add Google OAuth and 2FA support
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy import case, event, func
+from sqlalchemy.ext.hybrid import hybrid_property
 from datetime import datetime, timedelta
 import hashlib
+import hmac
 import os
 import secrets
-import uuid
 
 db = SQLAlchemy()
 
+# PBKDF2 parameters - hashlib.pbkdf2_hmac runs the whole loop inside OpenSSL
+PASSWORD_SALT_LENGTH = 32
+PASSWORD_HASH_ITERATIONS = 100000
+
+def _derive_key(password, salt):
+    """Derive the PBKDF2-HMAC-SHA256 key for a password"""
+    return hashlib.pbkdf2_hmac('sha256',
+                               password.encode('utf-8'),
+                               salt,
+                               PASSWORD_HASH_ITERATIONS)
+
+def _hash_matches(salt, password_hash, password):
+    """Check a password against a stored raw salt and hash"""
+    # A missing salt marks an unusable password (e.g. created via Google OAuth)
+    if salt is None:
+        return False
+    return hmac.compare_digest(_derive_key(password, salt), password_hash)
+
+def _hash_backup_code(code):
+    """Hash a 2FA backup code for storage"""
+    return hashlib.sha256(code.encode('utf-8')).hexdigest()
+
 user_event_association = db.Table(
     "user_event_association",
     db.Column("user_id", db.Integer, db.ForeignKey("users.id"), primary_key=True),
@@ -21,9 +46,11 @@ class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(256), nullable=False)
+    password_hash = db.Column(db.LargeBinary(32), nullable=False)
+    password_salt = db.Column(db.LargeBinary(32))  # NULL = unusable password
     first_name = db.Column(db.String(50))
     last_name = db.Column(db.String(50))
+    display_name = db.Column(db.String(101), index=True)  # first + ' ' + last; maintained on write, see _set_display_name
     age = db.Column(db.Integer)
     contact_number = db.Column(db.String(20))
     profile_picture = db.Column(db.String(200), default='default.png')
@@ -33,24 +60,26 @@ class User(UserMixin, db.Model):
     
     # Google OAuth fields
     google_id = db.Column(db.String(100), unique=True, nullable=True)
-    google_access_token = db.Column(db.Text, nullable=True)
-    google_refresh_token = db.Column(db.Text, nullable=True)
+    # TEXT columns are deferred so the per-request user_loader SELECT stays narrow;
+    # each group loads in one query the first time any of its attributes is touched
+    google_access_token = db.deferred(db.Column(db.Text, nullable=True), group='google_tokens')
+    google_refresh_token = db.deferred(db.Column(db.Text, nullable=True), group='google_tokens')
     email_verified = db.Column(db.Boolean, default=False)
     
     # Volunteer-specific fields
     volunteer_approved = db.Column(db.Boolean, default=False)
     volunteer_approved_at = db.Column(db.DateTime)
     volunteer_approved_by = db.Column(db.Integer, db.ForeignKey('users.id'))
-    volunteer_bio = db.Column(db.Text)
-    volunteer_skills = db.Column(db.Text)
+    volunteer_bio = db.deferred(db.Column(db.Text), group='volunteer_profile')
+    volunteer_skills = db.deferred(db.Column(db.Text), group='volunteer_profile')
     volunteer_availability = db.Column(db.String(200))
     volunteer_applied_at = db.Column(db.DateTime)
     
     # Security features
     failed_login_attempts = db.Column(db.Integer, default=0)
     last_failed_login = db.Column(db.DateTime)
-    account_locked_until = db.Column(db.DateTime)
-    password_reset_token = db.Column(db.String(100))
+    account_locked_until = db.Column(db.DateTime, index=True)
+    password_reset_token = db.Column(db.String(100), index=True)
     password_reset_expiry = db.Column(db.DateTime)
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -68,35 +97,35 @@ class User(UserMixin, db.Model):
     
     def set_password(self, password):
         """Enhanced password hashing with SHA-256 and salt"""
-        salt = os.urandom(32)
-        pwdhash = hashlib.pbkdf2_hmac('sha256', 
-                                      password.encode('utf-8'), 
-                                      salt, 
-                                      100000)
-        self.password_hash = (salt + pwdhash).hex()
+        salt = os.urandom(PASSWORD_SALT_LENGTH)
+        self.password_salt = salt
+        self.password_hash = _derive_key(password, salt)
         
+        # New users get their first history row from _seed_password_history
         if self.id:
             history = PasswordHistory(
                 user_id=self.id,
+                password_salt=self.password_salt,
                 password_hash=self.password_hash
             )
             db.session.add(history)
     
+    def set_unusable_password(self):
+        """Mark the account as having no password, skipping the expensive KDF"""
+        self.password_salt = None
+        self.password_hash = os.urandom(32)
+    
+    def has_usable_password(self):
+        """Check if the account can log in with a password"""
+        return self.password_salt is not None
+    
     def check_password(self, password):
         """Verify password against hash with brute force protection"""
         if self.account_locked_until and self.account_locked_until > datetime.utcnow():
             return False
         
         try:
-            stored = bytes.fromhex(self.password_hash)
-            salt = stored[:32]
-            stored_hash = stored[32:]
-            pwdhash = hashlib.pbkdf2_hmac('sha256',
-                                          password.encode('utf-8'),
-                                          salt,
-                                          100000)
-            
-            if pwdhash == stored_hash:
+            if _hash_matches(self.password_salt, self.password_hash, password):
                 self.failed_login_attempts = 0
                 self.last_login = datetime.utcnow()
                 return True
@@ -113,24 +142,22 @@ class User(UserMixin, db.Model):
     
     def check_password_history(self, password):
         """Check if password was used recently"""
-        recent_passwords = self.password_history.order_by(
-            PasswordHistory.created_at.desc()
-        ).limit(5).all()
+        # Plain select on the (user_id, created_at) index - MySQL stops after 5 rows
+        recent_hashes = db.session.execute(
+            db.select(PasswordHistory.password_salt, PasswordHistory.password_hash)
+            .where(PasswordHistory.user_id == self.id)
+            .order_by(PasswordHistory.created_at.desc())
+            .limit(5)
+        ).all()
         
-        for old_password in recent_passwords:
+        # Each distinct hash only needs deriving once; stop at the first match
+        for salt, pwdhash in dict.fromkeys(recent_hashes):
             try:
-                stored = bytes.fromhex(old_password.password_hash)
-                salt = stored[:32]
-                stored_hash = stored[32:]
-                pwdhash = hashlib.pbkdf2_hmac('sha256',
-                                              password.encode('utf-8'),
-                                              salt,
-                                              100000)
-                if pwdhash == stored_hash:
+                if _hash_matches(salt, pwdhash, password):
                     return True
-            except:
+            except (TypeError, ValueError):
+                # Malformed legacy row (e.g. a hex string not yet converted to bytes)
                 continue
-        
         return False
     
     def generate_reset_token(self):
@@ -140,11 +167,12 @@ class User(UserMixin, db.Model):
         return self.password_reset_token
     
     def verify_reset_token(self, token):
-        """Verify if reset token is valid"""
+        """Verify if reset token is valid
+        compare_digest only protects callers that already hold this user; see find_by_reset_token"""
         if not self.password_reset_token or not self.password_reset_expiry:
             return False
         
-        if self.password_reset_token != token:
+        if not hmac.compare_digest(self.password_reset_token.encode('utf-8'), (token or '').encode('utf-8')):
             return False
         
         if self.password_reset_expiry < datetime.utcnow():
@@ -152,6 +180,19 @@ class User(UserMixin, db.Model):
         
         return True
     
+    @classmethod
+    def find_by_reset_token(cls, token):
+        """Look up the user for a reset token via the token index, or None if invalid/expired
+        The indexed equality lookup is the real check and is not constant-time: any row it
+        returns already matches, so the compare_digest in verify_reset_token is only defence
+        in depth here. Tokens are 256-bit token_urlsafe values, so guessing one is infeasible."""
+        if not token:
+            return None
+        user = cls.query.filter_by(password_reset_token=token).first()
+        if user and user.verify_reset_token(token):
+            return user
+        return None
+    
     def has_2fa_enabled(self):
         """Check if user has 2FA enabled"""
         return self.two_factor_auth and self.two_factor_auth.is_enabled
@@ -216,15 +257,7 @@ class User(UserMixin, db.Model):
         
         try:
             # Verify password using your existing method
-            stored = bytes.fromhex(self.password_hash)
-            salt = stored[:32]
-            stored_hash = stored[32:]
-            pwdhash = hashlib.pbkdf2_hmac('sha256',
-                                          password.encode('utf-8'),
-                                          salt,
-                                          100000)
-            
-            if pwdhash == stored_hash:
+            if _hash_matches(self.password_salt, self.password_hash, password):
                 # Successful login
                 previous_failures = self.failed_login_attempts
                 self.failed_login_attempts = 0
@@ -269,7 +302,7 @@ class User(UserMixin, db.Model):
                 'error': str(e)
             }
 
-    @property
+    @hybrid_property
     def volunteer_status(self):
         """Get volunteer status as string"""
         if not self.is_volunteer:
@@ -279,17 +312,48 @@ class User(UserMixin, db.Model):
         else:
             return "Pending approval"
     
-    @property
+    @volunteer_status.expression
+    def volunteer_status(cls):
+        """SQL version so queries can filter on volunteer status server-side"""
+        return case(
+            (~func.coalesce(cls.is_volunteer, False), "Not a volunteer"),
+            (func.coalesce(cls.volunteer_approved, False), "Approved volunteer"),
+            else_="Pending approval"
+        )
+    
+    def compute_display_name(self):
+        """Build the display name from first/last name, falling back to username"""
+        parts = [p for p in (self.first_name, self.last_name) if p]
+        return ' '.join(parts) if parts else self.username
+    
+    @hybrid_property
     def full_name(self):
         """Get user's full name"""
-        if self.first_name and self.last_name:
-            return f"{self.first_name} {self.last_name}"
-        elif self.first_name:
-            return self.first_name
-        elif self.last_name:
-            return self.last_name
-        else:
-            return self.username
+        return self.display_name or self.compute_display_name()
+    
+    @full_name.expression
+    def full_name(cls):
+        """SQL version - reads the indexed display_name column"""
+        return cls.display_name
+
+@event.listens_for(User, 'before_insert')
+@event.listens_for(User, 'before_update')
+def _set_display_name(mapper, connection, target):
+    """Keep display_name in sync so reads never rebuild the name"""
+    target.display_name = target.compute_display_name()
+
+@event.listens_for(User, 'after_insert')
+def _seed_password_history(mapper, connection, target):
+    """Record the initial password in the same flush as the user INSERT"""
+    if target.password_salt is None:
+        return
+    connection.execute(
+        PasswordHistory.__table__.insert().values(
+            user_id=target.id,
+            password_salt=target.password_salt,
+            password_hash=target.password_hash
+        )
+    )
 
 class TwoFactorAuth(db.Model):
     """Two-factor authentication settings"""
@@ -298,29 +362,44 @@ class TwoFactorAuth(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, unique=True)
     is_enabled = db.Column(db.Boolean, default=False)
-    backup_codes = db.Column(db.Text)  # Comma-separated backup codes
+    backup_codes = db.Column(db.JSON)  # List of {"h": sha256 hex, "used": bool}
     temp_code = db.Column(db.String(10))  # Temporary verification code
     temp_code_expires = db.Column(db.DateTime)  # When temp code expires
     last_used = db.Column(db.DateTime)  # Last time 2FA was used
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    BACKUP_CODE_COUNT = 10
+    
+    def generate_backup_codes(self):
+        """Generate new backup codes, store their hashes and return the plaintext codes"""
+        codes = [f"{secrets.randbelow(100000000):08d}" for _ in range(self.BACKUP_CODE_COUNT)]
+        self.backup_codes = [{'h': _hash_backup_code(c), 'used': False} for c in codes]
+        return codes
+    
+    def remaining_backup_codes(self):
+        """Number of backup codes that have not been used yet"""
+        return sum(1 for entry in self.backup_codes or [] if not entry['used'])
+    
     def is_backup_code_valid(self, code):
         """Check if provided code is a valid backup code"""
         if not self.backup_codes:
             return False
         
-        codes = self.backup_codes.split(',')
-        if code in codes:
-            # Remove used code
-            codes.remove(code)
-            self.backup_codes = ','.join(codes)
-            self.last_used = datetime.utcnow()
-            return True
+        code_hash = _hash_backup_code(code)
+        for i, entry in enumerate(self.backup_codes):
+            if not entry['used'] and hmac.compare_digest(entry['h'], code_hash):
+                # Mark code as used - reassign so SQLAlchemy sees the JSON change
+                codes = list(self.backup_codes)
+                codes[i] = {'h': entry['h'], 'used': True}
+                self.backup_codes = codes
+                self.last_used = datetime.utcnow()
+                return True
         return False
     
     def verify_temp_code(self, code):
         """Verify temporary 2FA code"""
-        if (self.temp_code == code and 
+        if (self.temp_code and
+            hmac.compare_digest(self.temp_code.encode('utf-8'), (code or '').encode('utf-8')) and
             self.temp_code_expires and 
             self.temp_code_expires > datetime.utcnow()):
             self.last_used = datetime.utcnow()
@@ -328,32 +407,38 @@ class TwoFactorAuth(db.Model):
         return False
     
     def debug_backup_codes(self):
-        """Debug method to show backup codes (development only)"""
+        """Debug method to show backup code usage (development only)"""
         if not current_app.debug:
             return "Debug only"
         
-        if self.backup_codes:
-            codes = self.backup_codes.split(',')
-            return {
-                'total_codes': len(codes),
-                'remaining_codes': codes,
-                'codes_used': 10 - len(codes)
-            }
-        return {'total_codes': 0, 'remaining_codes': [], 'codes_used': 0}
+        total = len(self.backup_codes or [])
+        remaining = self.remaining_backup_codes()
+        return {
+            'total_codes': total,
+            'remaining_codes': remaining,
+            'codes_used': total - remaining
+        }
 
 # Keep all your existing models below (PasswordHistory, AuditLog, etc.)
 class PasswordHistory(db.Model):
     """Track password history to prevent reuse"""
     __tablename__ = 'password_history'
+    __table_args__ = (
+        db.Index('ix_pwhist_user_created', 'user_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    password_hash = db.Column(db.String(256), nullable=False)
+    password_hash = db.Column(db.LargeBinary(32), nullable=False)
+    password_salt = db.Column(db.LargeBinary(32))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class AuditLog(db.Model):
     """Security audit logging"""
     __tablename__ = 'audit_logs'
+    __table_args__ = (
+        db.Index('ix_audit_user_ts', 'user_id', 'timestamp'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
@@ -430,6 +515,7 @@ class FileReference(db.Model):
         return f"<File id={self.id} filename={self.uuid_filename}>"
     
     def generate_secure_filename(self, file_hash):
+        import uuid  # only needed on upload, keep it off the models import path
         return str(uuid.uuid4()).replace("-", "")
     
 class Post(db.Model):
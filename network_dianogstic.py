@@ -9,6 +9,34 @@ import socket
 import time
 import json
 from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+# One session for every probe so repeat hosts reuse their TCP/TLS connection
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=8))
+SESSION.headers.update({'User-Agent': 'SilverSage-Diag/1.0'})
+
+# (connect, read) - unreachable hosts fail after ~3s instead of the full read budget
+TIMEOUTS = (3.05, 7)
+DISCOVERY_TIMEOUTS = (3.05, 12)
+
+# Resolutions from test_dns_resolution, reused by the HTTP probes that follow
+DNS_CACHE_TTL = 300  # seconds
+_DNS_CACHE = {}
+_system_getaddrinfo = socket.getaddrinfo
+
+def _cached_getaddrinfo(host, port, *args, **kwargs):
+    """socket.getaddrinfo that serves fresh entries from _DNS_CACHE"""
+    entry = _DNS_CACHE.get((host, port))
+    if entry and time.time() - entry[1] < DNS_CACHE_TTL:
+        return entry[0]
+    return _system_getaddrinfo(host, port, *args, **kwargs)
+
+def _run_parallel(probe, items):
+    """Run probe over items concurrently, returning results in input order"""
+    with ThreadPoolExecutor(max_workers=len(items)) as executor:
+        return list(executor.map(probe, items))
 
 def test_dns_resolution():
     """Test DNS resolution for Google services"""
@@ -21,16 +49,20 @@ def test_dns_resolution():
         'google.com'
     ]
     
-    dns_results = {}
-    
-    for host in hosts_to_test:
+    def resolve(host):
         try:
-            ip = socket.gethostbyname(host)
-            dns_results[host] = f"✅ Resolved to {ip}"
-            print(f"  {host}: ✅ {ip}")
+            infos = _system_getaddrinfo(host, 443, proto=socket.IPPROTO_TCP)
+            _DNS_CACHE[(host, 443)] = (infos, time.time())
+            ip = infos[0][4][0]
+            return f"✅ Resolved to {ip}", f"  {host}: ✅ {ip}"
         except socket.gaierror as e:
-            dns_results[host] = f"❌ DNS Error: {e}"
-            print(f"  {host}: ❌ DNS Error: {e}")
+            return f"❌ DNS Error: {e}", f"  {host}: ❌ DNS Error: {e}"
+    
+    dns_results = {}
+    
+    for host, (result, line) in zip(hosts_to_test, _run_parallel(resolve, hosts_to_test)):
+        dns_results[host] = result
+        print(line)
     
     return dns_results
 
@@ -44,30 +76,31 @@ def test_basic_connectivity():
         'https://www.googleapis.com'
     ]
     
-    connectivity_results = {}
-    
-    for url in test_urls:
+    def probe(url):
         try:
             start_time = time.time()
-            response = requests.get(url, timeout=10)
-            end_time = time.time()
+            response = SESSION.get(url, timeout=TIMEOUTS)
+            elapsed = time.time() - start_time
             
-            connectivity_results[url] = {
+            result = {
                 'status': '✅ Success',
                 'status_code': response.status_code,
-                'response_time': f"{(end_time - start_time):.2f}s"
+                'response_time_s': elapsed
             }
-            print(f"  {url}: ✅ {response.status_code} ({(end_time - start_time):.2f}s)")
+            return result, f"  {url}: ✅ {response.status_code} ({elapsed:.2f}s)"
             
         except requests.exceptions.Timeout:
-            connectivity_results[url] = {'status': '❌ Timeout', 'error': 'Request timed out'}
-            print(f"  {url}: ❌ Timeout")
+            return {'status': '❌ Timeout', 'error': 'Request timed out'}, f"  {url}: ❌ Timeout"
         except requests.exceptions.ConnectionError as e:
-            connectivity_results[url] = {'status': '❌ Connection Error', 'error': str(e)}
-            print(f"  {url}: ❌ Connection Error: {e}")
+            return {'status': '❌ Connection Error', 'error': str(e)}, f"  {url}: ❌ Connection Error: {e}"
         except Exception as e:
-            connectivity_results[url] = {'status': '❌ Error', 'error': str(e)}
-            print(f"  {url}: ❌ Error: {e}")
+            return {'status': '❌ Error', 'error': str(e)}, f"  {url}: ❌ Error: {e}"
+    
+    connectivity_results = {}
+    
+    for url, (result, line) in zip(test_urls, _run_parallel(probe, test_urls)):
+        connectivity_results[url] = result
+        print(line)
     
     return connectivity_results
 
@@ -82,64 +115,67 @@ def test_google_oauth_endpoints():
         'UserInfo': 'https://www.googleapis.com/oauth2/v2/userinfo'
     }
     
-    oauth_results = {}
-    
-    for name, url in endpoints.items():
+    def probe(item):
+        name, url = item
         try:
             start_time = time.time()
             
             if name == 'Discovery':
                 # For discovery, we expect JSON response
-                response = requests.get(url, timeout=15)
-                end_time = time.time()
+                response = SESSION.get(url, timeout=DISCOVERY_TIMEOUTS)
+                elapsed = time.time() - start_time
                 
                 if response.status_code == 200:
                     try:
                         data = response.json()
-                        oauth_results[name] = {
+                        result = {
                             'status': '✅ Success',
                             'status_code': response.status_code,
-                            'response_time': f"{(end_time - start_time):.2f}s",
+                            'response_time_s': elapsed,
                             'has_endpoints': bool(data.get('authorization_endpoint') and 
                                                  data.get('token_endpoint') and 
                                                  data.get('userinfo_endpoint'))
                         }
-                        print(f"  {name}: ✅ {response.status_code} ({(end_time - start_time):.2f}s) - Valid JSON")
+                        return result, f"  {name}: ✅ {response.status_code} ({elapsed:.2f}s) - Valid JSON"
                     except json.JSONDecodeError:
-                        oauth_results[name] = {
+                        result = {
                             'status': '❌ Invalid JSON',
                             'status_code': response.status_code,
-                            'response_time': f"{(end_time - start_time):.2f}s"
+                            'response_time_s': elapsed
                         }
-                        print(f"  {name}: ❌ {response.status_code} - Invalid JSON response")
+                        return result, f"  {name}: ❌ {response.status_code} - Invalid JSON response"
                 else:
-                    oauth_results[name] = {
+                    result = {
                         'status': f'❌ HTTP {response.status_code}',
                         'status_code': response.status_code,
-                        'response_time': f"{(end_time - start_time):.2f}s"
+                        'response_time_s': elapsed
                     }
-                    print(f"  {name}: ❌ HTTP {response.status_code}")
+                    return result, f"  {name}: ❌ HTTP {response.status_code}"
             else:
                 # For other endpoints, just check if they're reachable
-                response = requests.head(url, timeout=10)
-                end_time = time.time()
+                response = SESSION.head(url, timeout=TIMEOUTS)
+                elapsed = time.time() - start_time
                 
-                oauth_results[name] = {
+                result = {
                     'status': '✅ Reachable' if response.status_code < 500 else f'❌ HTTP {response.status_code}',
                     'status_code': response.status_code,
-                    'response_time': f"{(end_time - start_time):.2f}s"
+                    'response_time_s': elapsed
                 }
-                print(f"  {name}: {'✅' if response.status_code < 500 else '❌'} {response.status_code} ({(end_time - start_time):.2f}s)")
+                return result, f"  {name}: {'✅' if response.status_code < 500 else '❌'} {response.status_code} ({elapsed:.2f}s)"
                 
         except requests.exceptions.Timeout:
-            oauth_results[name] = {'status': '❌ Timeout', 'error': 'Request timed out'}
-            print(f"  {name}: ❌ Timeout (>15s)")
+            return {'status': '❌ Timeout', 'error': 'Request timed out'}, f"  {name}: ❌ Timeout"
         except requests.exceptions.ConnectionError as e:
-            oauth_results[name] = {'status': '❌ Connection Error', 'error': str(e)}
-            print(f"  {name}: ❌ Connection Error")
+            return {'status': '❌ Connection Error', 'error': str(e)}, f"  {name}: ❌ Connection Error"
         except Exception as e:
-            oauth_results[name] = {'status': '❌ Error', 'error': str(e)}
-            print(f"  {name}: ❌ Error: {e}")
+            return {'status': '❌ Error', 'error': str(e)}, f"  {name}: ❌ Error: {e}"
+    
+    oauth_results = {}
+    
+    items = list(endpoints.items())
+    for (name, _), (result, line) in zip(items, _run_parallel(probe, items)):
+        oauth_results[name] = result
+        print(line)
     
     return oauth_results
 
@@ -155,22 +191,30 @@ def test_with_different_user_agents():
     }
     
     url = 'https://accounts.google.com/.well-known/openid_configuration'
-    ua_results = {}
     
-    for name, ua in user_agents.items():
+    def probe(item):
+        name, ua = item
         try:
             headers = {'User-Agent': ua}
-            response = requests.get(url, headers=headers, timeout=10)
+            # Only the status code matters here, so don't download the body
+            response = SESSION.get(url, headers=headers, timeout=TIMEOUTS, stream=True)
+            response.close()
             
-            ua_results[name] = {
+            result = {
                 'status': '✅ Success' if response.status_code == 200 else f'❌ HTTP {response.status_code}',
                 'status_code': response.status_code
             }
-            print(f"  {name}: {'✅' if response.status_code == 200 else '❌'} {response.status_code}")
+            return result, f"  {name}: {'✅' if response.status_code == 200 else '❌'} {response.status_code}"
             
         except Exception as e:
-            ua_results[name] = {'status': '❌ Error', 'error': str(e)}
-            print(f"  {name}: ❌ Error: {e}")
+            return {'status': '❌ Error', 'error': str(e)}, f"  {name}: ❌ Error: {e}"
+    
+    ua_results = {}
+    
+    items = list(user_agents.items())
+    for (name, _), (result, line) in zip(items, _run_parallel(probe, items)):
+        ua_results[name] = result
+        print(line)
     
     return ua_results
 
@@ -248,15 +292,18 @@ def main():
     print("This tool will help diagnose network connectivity issues")
     print("that prevent Google OAuth from working properly.\n")
     
+    # Let the HTTP probes skip DNS for hosts the resolution test already looked up
+    socket.getaddrinfo = _cached_getaddrinfo
     try:
-        # Run all tests
-        results = {
-            'dns': test_dns_resolution(),
-            'connectivity': test_basic_connectivity(),
-            'oauth': test_google_oauth_endpoints(),
-            'user_agents': test_with_different_user_agents(),
-            'proxy': check_proxy_settings()
-        }
+        with SESSION:
+            # Run all tests
+            results = {
+                'dns': test_dns_resolution(),
+                'connectivity': test_basic_connectivity(),
+                'oauth': test_google_oauth_endpoints(),
+                'user_agents': test_with_different_user_agents(),
+                'proxy': check_proxy_settings()
+            }
         
         # Generate solutions
         generate_solutions(results)
@@ -289,6 +336,8 @@ def main():
         print(f"\n❌ Unexpected error during diagnosis: {e}")
         print("Please ensure you have the 'requests' package installed:")
         print("pip install requests")
+    finally:
+        socket.getaddrinfo = _system_getaddrinfo
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
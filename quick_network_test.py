@@ -6,6 +6,23 @@ Run this to quickly test if you can reach Google's services
 
 import requests
 import time
+from requests.adapters import HTTPAdapter
+
+# One session for every probe so repeat hosts reuse their TCP/TLS connection
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=8))
+SESSION.headers.update({'User-Agent': 'SilverSage-Diag/1.0'})
+
+# (connect, read) - unreachable hosts fail after ~3s instead of the full read budget
+TIMEOUTS = (3.05, 7)
+
+def _probe(url, timeout=TIMEOUTS):
+    """Fetch only the status line; fall back to a streamed GET if HEAD is refused"""
+    response = SESSION.head(url, timeout=timeout, allow_redirects=True)
+    if response.status_code in (405, 501):
+        response = SESSION.get(url, timeout=timeout, stream=True)
+        response.close()
+    return response
 
 def quick_test():
     """Quick test to diagnose the Google Discovery failure"""
@@ -25,7 +42,7 @@ def quick_test():
         print(f"\nTesting {name}...")
         try:
             start_time = time.time()
-            response = requests.get(url, timeout=10)
+            response = _probe(url)
             end_time = time.time()
             
             if response.status_code == 200:
@@ -36,8 +53,8 @@ def quick_test():
                 print(f"  ⚠️ HTTP {response.status_code}")
                 
         except requests.exceptions.Timeout:
-            results[name] = "❌ Timeout (>10s)"
-            print("  ❌ Timeout (>10 seconds)")
+            results[name] = "❌ Timeout"
+            print("  ❌ Timeout")
         except requests.exceptions.ConnectionError:
             results[name] = "❌ Connection Error"
             print("  ❌ Connection Error")
@@ -76,7 +93,8 @@ def quick_test():
 
 if __name__ == "__main__":
     try:
-        quick_test()
+        with SESSION:
+            quick_test()
     except KeyboardInterrupt:
         print("\n\n👋 Test cancelled")
     except ImportError:
@@ -5,9 +5,13 @@ Implements security best practices for elderly users
 
 import re
 import os
+import mmap
 import secrets
+import time
+from collections import deque
 from functools import wraps
-from flask import request, abort, current_app, session
+from threading import Lock
+from flask import request, abort, current_app, session, g
 from markupsafe import escape
 from flask_login import current_user
 from models import db, AuditLog, FileReference
@@ -15,12 +19,49 @@ import hashlib
 import hmac
 from datetime import datetime, timedelta
 
+try:
+    import redis
+except ImportError:
+    redis = None
+
 # Security configuration
 MAX_LOGIN_ATTEMPTS = 5
 LOCKOUT_DURATION = 30  # minutes
 PASSWORD_MIN_LENGTH = 8
 PASSWORD_HISTORY_COUNT = 5
 SESSION_TIMEOUT = 60  # minutes
+SESSION_ACTIVITY_REFRESH = 60  # seconds
+RATE_LIMIT_MAX_TRACKED = 1024  # client IPs per decorated view
+ALLOWED_IMAGE_EXTENSIONS = frozenset({'.jpg', '.jpeg', '.png', '.gif'})
+
+_PASSWORD_SPECIALS = frozenset('!@#$%^&*(),.?":{}|<>')
+COMMON_PASSWORDS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'common_passwords.txt')
+
+def _load_common_passwords():
+    """Built-in common passwords plus an optional one-per-line corpus file"""
+    passwords = {'password', '12345678', 'qwerty', 'admin123', 'letmein'}
+    try:
+        with open(COMMON_PASSWORDS_FILE, 'r', encoding='utf-8', errors='ignore') as f:
+            passwords.update(line.strip().lower() for line in f if line.strip())
+    except FileNotFoundError:
+        pass
+    return frozenset(passwords)
+
+_COMMON_PASSWORDS = _load_common_passwords()
+
+_RE_UNSAFE_FILENAME_CHARS = re.compile(r'[^a-zA-Z0-9._-]')
+_RE_VALID_FILENAME = re.compile(r'[a-zA-Z0-9_.-]+')
+
+_NULL_BYTE_TABLE = str.maketrans({'\x00': None})
+_HTML_ESCAPE_TABLE = str.maketrans({
+    '\x00': None,
+    '<': '&lt;',
+    '>': '&gt;',
+    '"': '&quot;',
+    "'": '&#x27;',
+    '/': '&#x2F;',
+    '=': '&#x3D;'
+})
 
 def validate_password_strength(password):
     """
@@ -33,53 +74,126 @@ def validate_password_strength(password):
     if len(password) < PASSWORD_MIN_LENGTH:
         errors.append(f"Password must be at least {PASSWORD_MIN_LENGTH} characters long")
     
+    # Classify every character in one pass instead of one regex walk per rule
+    has_upper = has_lower = has_digit = has_special = False
+    for c in password:
+        if 'A' <= c <= 'Z':
+            has_upper = True
+        elif 'a' <= c <= 'z':
+            has_lower = True
+        elif c.isdecimal():
+            has_digit = True
+        elif c in _PASSWORD_SPECIALS:
+            has_special = True
+        if has_upper and has_lower and has_digit and has_special:
+            break
+    
     # Uppercase check
-    if not re.search(r'[A-Z]', password):
+    if not has_upper:
         errors.append("Password must contain at least one uppercase letter")
     
     # Lowercase check
-    if not re.search(r'[a-z]', password):
+    if not has_lower:
         errors.append("Password must contain at least one lowercase letter")
     
     # Number check
-    if not re.search(r'\d', password):
+    if not has_digit:
         errors.append("Password must contain at least one number")
     
     # Special character check
-    if not re.search(r'[!@#$%^&*(),.?":{}|<>]', password):
+    if not has_special:
         errors.append("Password must contain at least one special character")
     
     # Common password check
-    common_passwords = ['password', '12345678', 'qwerty', 'admin123', 'letmein']
-    if password.lower() in common_passwords:
+    if password.lower() in _COMMON_PASSWORDS:
         errors.append("Password is too common. Please choose a stronger password")
     
     return (len(errors) == 0, errors)
 
 def log_security_event(action, success=True, details=None):
-    """Log security-related events for audit trail"""
+    """Log security-related events for audit trail
+    Events are queued on the request and written together by flush_security_events"""
     try:
-        log = AuditLog(
-            user_id=current_user.id if current_user.is_authenticated else None,
-            action=action,
-            ip_address=get_client_ip(),
-            user_agent=request.headers.get('User-Agent', '')[:200],
-            success=success,
-            details=details
-        )
-        db.session.add(log)
-        db.session.commit()
+        pending = g.setdefault('pending_audit_logs', [])
+        pending.append({
+            'user_id': current_user.id if current_user.is_authenticated else None,
+            'action': action,
+            'ip_address': get_client_ip(),
+            'user_agent': request.headers.get('User-Agent', '')[:200],
+            'timestamp': datetime.utcnow(),
+            'success': success,
+            'details': details if details is None or isinstance(details, str) else str(details)
+        })
     except Exception as e:
         current_app.logger.error(f"Failed to log security event: {str(e)}")
 
+def flush_security_events(exception=None):
+    """Write the request's queued audit events in a single transaction"""
+    pending = g.pop('pending_audit_logs', None)
+    if not pending:
+        return
+    try:
+        # Own connection so a failed request's session state is never committed with the logs
+        with db.engine.begin() as connection:
+            connection.execute(db.insert(AuditLog), pending)
+    except Exception as e:
+        current_app.logger.error(f"Failed to log security events: {str(e)}")
+
 def get_client_ip():
-    """Get client IP address, handling proxies"""
-    if request.environ.get('HTTP_X_FORWARDED_FOR'):
-        return request.environ['HTTP_X_FORWARDED_FOR'].split(',')[0]
-    elif request.environ.get('HTTP_X_REAL_IP'):
-        return request.environ.get('HTTP_X_REAL_IP')
-    else:
-        return request.environ.get('REMOTE_ADDR', 'unknown')
+    """Get client IP address, handling proxies
+    Resolved once per request and cached on flask.g"""
+    ip = g.get('_client_ip')
+    if ip is None:
+        environ = request.environ
+        forwarded = environ.get('HTTP_X_FORWARDED_FOR')
+        if forwarded:
+            ip = forwarded.split(',', 1)[0]
+        else:
+            ip = environ.get('HTTP_X_REAL_IP') or environ.get('REMOTE_ADDR', 'unknown')
+        g._client_ip = ip
+    return ip
+
+# Token bucket shared by every worker: (tokens, ts) per key, refilled at capacity/window per second.
+# The caller passes the time in (integer ms), so the script is deterministic and runs under script replication too.
+_TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])  -- milliseconds
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * capacity / (window * 1000))
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', string.format('%.17g', tokens), 'ts', string.format('%d', now))
+redis.call('EXPIRE', KEYS[1], math.ceil(window * 2))
+return allowed
+"""
+
+_token_bucket_lock = Lock()
+
+def _get_token_bucket():
+    """The current app's registered Redis token-bucket script, or None when RATE_LIMIT_REDIS_URL isn't configured"""
+    extensions = current_app.extensions
+    token_bucket = extensions.get('rate_limit_token_bucket')
+    if token_bucket is None:
+        with _token_bucket_lock:
+            token_bucket = extensions.get('rate_limit_token_bucket')
+            if token_bucket is None:
+                url = current_app.config.get('RATE_LIMIT_REDIS_URL')
+                if url and redis is None:
+                    current_app.logger.warning("RATE_LIMIT_REDIS_URL is set but the redis package isn't installed; "
+                                               "rate limits are per process")
+                if redis is None or not url:
+                    token_bucket = False
+                else:
+                    client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+                    token_bucket = client.register_script(_TOKEN_BUCKET_LUA)
+                extensions['rate_limit_token_bucket'] = token_bucket
+    return token_bucket or None
 
 def rate_limit(max_requests=5, window_seconds=60):
     """
@@ -87,28 +201,54 @@ def rate_limit(max_requests=5, window_seconds=60):
     Prevents brute force attacks
     """
     def decorator(f):
-        # Simple in-memory storage (use Redis in production)
+        # Per-process fallback when Redis isn't configured or is unreachable
         request_counts = {}
+        lock = Lock()
+        
+        def _local_rate_limited(identifier):
+            now = datetime.utcnow()
+            cutoff = now - timedelta(seconds=window_seconds)
+            
+            with lock:
+                # Drop clients that have gone quiet so the table stays bounded
+                if len(request_counts) > RATE_LIMIT_MAX_TRACKED:
+                    for key in [k for k, v in request_counts.items() if not v or v[-1] <= cutoff]:
+                        del request_counts[key]
+                
+                timestamps = request_counts.setdefault(identifier, deque(maxlen=max_requests))
+                
+                # Clean old entries
+                while timestamps and timestamps[0] <= cutoff:
+                    timestamps.popleft()
+                
+                # Check rate limit
+                limited = len(timestamps) >= max_requests
+                if not limited:
+                    # Add current request
+                    timestamps.append(now)
+            return limited
         
         @wraps(f)
         def decorated_function(*args, **kwargs):
             identifier = get_client_ip()
-            now = datetime.utcnow()
             
-            # Clean old entries
-            request_counts[identifier] = [
-                timestamp for timestamp in request_counts.get(identifier, [])
-                if timestamp > now - timedelta(seconds=window_seconds)
-            ]
+            # Shared across workers so the limit doesn't multiply by the worker count
+            limited = None
+            token_bucket = _get_token_bucket()
+            if token_bucket is not None:
+                try:
+                    key = f"rl:{request.endpoint}:{identifier}"
+                    limited = not token_bucket(keys=[key], args=[max_requests, window_seconds, int(time.time() * 1000)])
+                except redis.RedisError as e:
+                    current_app.logger.warning(f"Redis rate limit unavailable, using local counts: {str(e)}")
+            
+            if limited is None:
+                limited = _local_rate_limited(identifier)
             
-            # Check rate limit
-            if len(request_counts.get(identifier, [])) >= max_requests:
+            if limited:
                 log_security_event(f"Rate limit exceeded for {request.endpoint}", success=False)
                 abort(429, description="Too many requests. Please try again later.")
             
-            # Add current request
-            request_counts.setdefault(identifier, []).append(now)
-            
             return f(*args, **kwargs)
         
         return decorated_function
@@ -122,23 +262,9 @@ def sanitize_input(input_string, allow_html=False):
     if not input_string:
         return input_string
     
-    # Remove any null bytes
-    input_string = input_string.replace('\x00', '')
-    
-    if not allow_html:
-        # Escape HTML characters
-        replacements = {
-            '<': '&lt;',
-            '>': '&gt;',
-            '"': '&quot;',
-            "'": '&#x27;',
-            '/': '&#x2F;',
-            '=': '&#x3D;'
-        }
-        for char, escape in replacements.items():
-            input_string = input_string.replace(char, escape)
-    
-    return input_string.strip()
+    # Strip null bytes (and escape HTML characters) in a single C-level pass
+    table = _NULL_BYTE_TABLE if allow_html else _HTML_ESCAPE_TABLE
+    return input_string.translate(table).strip()
 
 def alt_sanitize_input(input_string, allow_html=False) -> str:
     """
@@ -159,16 +285,24 @@ def generate_csrf_token():
 
 def validate_csrf_token(token):
     """Validate CSRF token"""
-    return token == session.get('csrf_token')
+    expected = session.get('csrf_token')
+    if not token or not expected:
+        return False
+    return hmac.compare_digest(str(token).encode('utf-8'), expected.encode('utf-8'))
 
 def check_session_timeout():
     """Check if user session has timed out"""
     if current_user.is_authenticated:
-        if 'last_activity' in session:
-            time_since_activity = datetime.utcnow() - session['last_activity']
-            if time_since_activity > timedelta(minutes=SESSION_TIMEOUT):
-                return False
-        session['last_activity'] = datetime.utcnow()
+        now = time.time()
+        last_activity = session.get('last_activity')
+        if not isinstance(last_activity, (int, float)):
+            # Missing, or a datetime written by an older version
+            last_activity = None
+        if last_activity is not None and now - last_activity > SESSION_TIMEOUT * 60:
+            return False
+        # Only rewrite (and re-sign) the session cookie once the value is stale
+        if last_activity is None or now - last_activity > SESSION_ACTIVITY_REFRESH:
+            session['last_activity'] = now
     return True
 
 def secure_filename_custom(filename):
@@ -176,31 +310,26 @@ def secure_filename_custom(filename):
     Enhanced secure filename function
     Removes potentially dangerous characters from filenames
     """
-    # Remove path separators and null bytes
-    filename = filename.replace('/', '').replace('\\', '').replace('\x00', '')
-    
-    # Keep only safe characters
-    safe_chars = re.sub(r'[^a-zA-Z0-9._-]', '', filename)
+    # Keep only safe characters (path separators and null bytes are dropped too)
+    safe_chars = _RE_UNSAFE_FILENAME_CHARS.sub('', filename)
     
     # Ensure it has a safe extension
     name, ext = os.path.splitext(safe_chars)
-    if ext.lower() not in ['.jpg', '.jpeg', '.png', '.gif']:
+    if ext.lower() not in ALLOWED_IMAGE_EXTENSIONS:
         return None
     
-    # Add timestamp to prevent collisions
-    timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
-    return f"{timestamp}_{safe_chars}"
+    # Add a random prefix to prevent collisions
+    return f"{secrets.token_urlsafe(8)}_{safe_chars}"
 
 def alt_secure_filename_custom(filename):
-    valid_characters = r"[a-zA-Z0-9_-\.]+"
     try:
         # Refer to models.FileReference as well
-        is_valid = re.fullmatch(valid_characters, filename)
+        is_valid = _RE_VALID_FILENAME.fullmatch(filename)
         if not is_valid:
             # An invalid character is found in the string
             return None
         name, ext = os.path.splitext(filename)
-        if ext.lower() not in ['.jpg', '.jpeg', '.png', '.gif']:
+        if ext.lower() not in ALLOWED_IMAGE_EXTENSIONS:
             return None
         
         file = FileReference(original_filename = filename)
@@ -215,28 +344,44 @@ def alt_secure_filename_custom(filename):
 
 def hash_file(filepath):
     """Generate SHA-256 hash of a file for integrity checking"""
-    sha256_hash = hashlib.sha256()
     with open(filepath, "rb") as f:
-        for byte_block in iter(lambda: f.read(4096), b""):
+        try:
+            # Hash the whole mapped file in one C call (no Python read loop)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return hashlib.sha256(mm).hexdigest()
+        except ValueError:
+            # Empty files can't be mapped
+            return hashlib.sha256().hexdigest()
+        except OSError:
+            # Not mappable (e.g. a pipe) - fall back to a buffered read
+            pass
+        if hasattr(hashlib, 'file_digest'):
+            return hashlib.file_digest(f, 'sha256').hexdigest()
+        sha256_hash = hashlib.sha256()
+        for byte_block in iter(lambda: f.read(262144), b""):
             sha256_hash.update(byte_block)
     return sha256_hash.hexdigest()
 
 # Security headers middleware
+# Updated CSP to include Leaflet marker images
+CONTENT_SECURITY_POLICY = (
+    "default-src 'self'; "
+    "style-src 'self' 'unsafe-inline' https://unpkg.com; "
+    "script-src 'self' 'unsafe-inline' https://unpkg.com; "
+    "connect-src 'self' https://*.tile.openstreetmap.org; "
+    "img-src 'self' data: https://*.tile.openstreetmap.org https://unpkg.com; "
+    "font-src 'self' data:"
+)
+
+SECURITY_HEADERS = {
+    'X-Content-Type-Options': 'nosniff',
+    'X-Frame-Options': 'DENY',
+    'X-XSS-Protection': '1; mode=block',
+    'Strict-Transport-Security': 'max-age=31536000; includeSubDomains',
+    'Content-Security-Policy': CONTENT_SECURITY_POLICY
+}
+
 def add_security_headers(response):
     """Add security headers to all responses"""
-    response.headers['X-Content-Type-Options'] = 'nosniff'
-    response.headers['X-Frame-Options'] = 'DENY'
-    response.headers['X-XSS-Protection'] = '1; mode=block'
-    response.headers['Strict-Transport-Security'] = 'max-age=31536000; includeSubDomains'
-    
-    # Updated CSP to include Leaflet marker images
-    response.headers['Content-Security-Policy'] = (
-        "default-src 'self'; "
-        "style-src 'self' 'unsafe-inline' https://unpkg.com; "
-        "script-src 'self' 'unsafe-inline' https://unpkg.com; "
-        "connect-src 'self' https://*.tile.openstreetmap.org; "
-        "img-src 'self' data: https://*.tile.openstreetmap.org https://unpkg.com; "
-        "font-src 'self' data:"
-    )
-    
+    response.headers.update(SECURITY_HEADERS)
     return response
@@ -1,9 +1,32 @@
 import json
 import os
+import re
 import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from types import MappingProxyType
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
+def _loads(data):
+    """Parse UTF-8 JSON bytes (orjson when installed)"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def _dumps(obj):
+    """Serialize to compact UTF-8 JSON bytes (orjson when installed)"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
 # Default accessibility settings optimized for elderly users
 DEFAULT_SETTINGS = {
     'font_size': 18,  # Larger default font for elderly
@@ -11,40 +34,112 @@ DEFAULT_SETTINGS = {
     'theme': 'light',  # light or dark only
 }
 
+# Shared read-only view returned whenever a user has no saved settings
+DEFAULT_SETTINGS_VIEW = MappingProxyType(DEFAULT_SETTINGS)
+
+_VALID_LANGUAGES = frozenset({'en', 'zh'})
+_VALID_THEMES = frozenset({'light', 'dark'})
+
+def _clean_font_size(value):
+    font_size = int(value)
+    return font_size if 14 <= font_size <= 28 else 18
+
+# setting -> (cleaner, default); a cleaner that raises falls back to the default
+_SETTING_VALIDATORS = {
+    'font_size': (_clean_font_size, 18),  # 14-28px range
+    'language': (lambda v: v if v in _VALID_LANGUAGES else 'en', 'en'),  # English and Chinese only
+    'theme': (lambda v: v if v in _VALID_THEMES else 'light', 'light'),  # light and dark only
+}
+
+def _clean_settings(settings):
+    """Validate each known setting, substituting its default when invalid"""
+    cleaned = {}
+    for key, (clean, default) in _SETTING_VALIDATORS.items():
+        try:
+            cleaned[key] = clean(settings.get(key, default))
+        except (ValueError, TypeError):
+            cleaned[key] = default
+    return cleaned
+
+_settings_dir = None
+_user_file_template = None
+_default_file = None
+
+SETTINGS_FILE_MODE = 0o644
+
+# Parsed settings by user_id, validated against the file's stat on every load
+SETTINGS_CACHE_SIZE = 128
+_settings_cache = OrderedDict()
+_settings_cache_lock = threading.Lock()
+
+def _file_stamp(st):
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+def _cache_get(user_id, stamp):
+    """Cached settings for user_id if they were parsed from the same file version"""
+    with _settings_cache_lock:
+        cached = _settings_cache.get(user_id)
+        if cached is None or cached[0] != stamp:
+            return None
+        _settings_cache.move_to_end(user_id)
+        return cached[1]
+
+def _cache_put(user_id, stamp, settings):
+    with _settings_cache_lock:
+        _settings_cache[user_id] = (stamp, settings)
+        _settings_cache.move_to_end(user_id)
+        if len(_settings_cache) > SETTINGS_CACHE_SIZE:
+            _settings_cache.popitem(last=False)
+
 def get_settings_dir():
-    """Get or create settings directory"""
-    settings_dir = os.path.join(os.getcwd(), 'user_settings')
-    if not os.path.exists(settings_dir):
+    """Get or create settings directory (created once per process)"""
+    global _settings_dir, _user_file_template, _default_file
+    if _settings_dir is None:
+        settings_dir = os.path.join(os.getcwd(), 'user_settings')
         os.makedirs(settings_dir, exist_ok=True)
-    return settings_dir
+        _user_file_template = os.path.join(settings_dir, 'user_%s.json')
+        _default_file = os.path.join(settings_dir, 'default_user.json')
+        _settings_dir = settings_dir
+    return _settings_dir
+
+def _settings_filename(user_id):
+    """Path of the settings file for user_id (or the shared default file)"""
+    if _settings_dir is None:
+        get_settings_dir()
+    return _user_file_template % (user_id,) if user_id else _default_file
 
 def load_user_settings(user_id=None):
     """
     Load user settings from a file.
-    Returns default settings if file doesn't exist.
+    Returns a copy of the default settings if file doesn't exist.
     """
     try:
-        settings_dir = get_settings_dir()
-        
-        if user_id:
-            filename = os.path.join(settings_dir, f'user_{user_id}.json')
-        else:
-            filename = os.path.join(settings_dir, 'default_user.json')
-
-        if os.path.exists(filename):
-            with open(filename, 'r', encoding='utf-8') as f:
-                settings = json.load(f)
-                # Merge with defaults to ensure all keys exist
-                merged_settings = DEFAULT_SETTINGS.copy()
-                merged_settings.update(settings)
-                logger.info(f"Loaded settings for user {user_id}: {merged_settings}")
-                return merged_settings
-        else:
-            logger.info(f"No settings file found for user {user_id}, using defaults")
+        filename = _settings_filename(user_id)
+
+        try:
+            st = os.stat(filename)
+        except FileNotFoundError:
+            logger.info("No settings file found for user %s, using defaults", user_id)
             return DEFAULT_SETTINGS.copy()
+        
+        # Reuse the parsed file while it is unchanged on disk
+        stamp = _file_stamp(st)
+        cached = _cache_get(user_id, stamp)
+        if cached is not None:
+            return cached.copy()
+        
+        with open(filename, 'rb') as f:
+            settings = _loads(f.read())
+        
+        # Merge with defaults to ensure all keys exist
+        merged_settings = {**DEFAULT_SETTINGS, **settings}
+        logger.info("Loaded settings for user %s: %s", user_id, merged_settings)
+        
+        _cache_put(user_id, stamp, merged_settings)
+        return merged_settings.copy()
             
     except Exception as e:
-        logger.error(f"Error loading settings for user {user_id}: {e}")
+        logger.error("Error loading settings for user %s: %s", user_id, e)
         return DEFAULT_SETTINGS.copy()
 
 
@@ -54,60 +149,40 @@ def save_user_settings(settings, user_id=None):
     """
     try:
         settings_dir = get_settings_dir()
-        
-        if user_id:
-            filename = os.path.join(settings_dir, f'user_{user_id}.json')
-        else:
-            filename = os.path.join(settings_dir, 'default_user.json')
+        filename = _settings_filename(user_id)
 
         # Validate and clean settings
-        cleaned_settings = {}
+        cleaned_settings = _clean_settings(settings)
 
-        # Font size validation (14-28px range)
-        font_size = settings.get('font_size', 18)
+        # Save to file: compact JSON written to a temp file, then atomically swapped in
+        data = _dumps(cleaned_settings)
+        fd, tmp_path = tempfile.mkstemp(dir=settings_dir, suffix='.tmp')
         try:
-            font_size = int(font_size)
-            if 14 <= font_size <= 28:
-                cleaned_settings['font_size'] = font_size
-            else:
-                cleaned_settings['font_size'] = 18
-        except (ValueError, TypeError):
-            cleaned_settings['font_size'] = 18
-
-        # Language validation (only English and Chinese)
-        language = settings.get('language', 'en')
-        if language in ['en', 'zh']:
-            cleaned_settings['language'] = language
-        else:
-            cleaned_settings['language'] = 'en'
-
-        # Theme validation (only light and dark)
-        theme = settings.get('theme', 'light')
-        if theme in ['light', 'dark']:
-            cleaned_settings['theme'] = theme
-        else:
-            cleaned_settings['theme'] = 'light'
-
-        # Save to file
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(cleaned_settings, f, indent=2, ensure_ascii=False)
+            # mkstemp creates 0600 files; keep the mode plain open() used to give settings files
+            os.chmod(tmp_path, SETTINGS_FILE_MODE)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                f.flush()
+                # Stamp of the file we wrote (the rename keeps inode and mtime)
+                stamp = _file_stamp(os.fstat(f.fileno()))
+            os.replace(tmp_path, filename)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        
+        # Prime the cache with what we just wrote so the next load skips the parse
+        _cache_put(user_id, stamp, {**DEFAULT_SETTINGS, **cleaned_settings})
             
-        logger.info(f"Settings saved for user {user_id}: {cleaned_settings}")
+        logger.info("Settings saved for user %s: %s", user_id, cleaned_settings)
         return True
 
     except Exception as e:
-        logger.error(f"Error saving settings for user {user_id}: {e}")
+        logger.error("Error saving settings for user %s: %s", user_id, e)
         return False
 
 
-def get_accessibility_css(settings):
-    """
-    Generate CSS based on accessibility settings optimized for elderly users.
-    """
-    font_size = settings.get('font_size', 18)
-    theme = settings.get('theme', 'light')
-
-    css = f"""<style>
+# Accessibility CSS pieces; only the base block depends on a setting (font_size)
+_BASE_CSS_TEMPLATE = """<style>
 :root {{
     --base-font-size: {font_size}px;
     --border-radius: 8px;
@@ -196,9 +271,8 @@ a {{
 }}
 """
 
-    # Theme-specific styles
-    if theme == 'dark':
-        css += """
+# Dark theme for reduced eye strain
+_DARK_CSS = """
 /* Dark theme for reduced eye strain */
 body {
     background-color: #121212 !important;
@@ -273,8 +347,9 @@ input[type="range"] {
     background-color: #1e1e1e !important;
 }
 """
-    else:  # Light theme (default)
-        css += """
+
+# Light theme (default)
+_LIGHT_CSS = """
 /* Light theme with enhanced readability */
 body {
     background-color: #ffffff !important;
@@ -322,8 +397,8 @@ body {
 }
 """
 
-    # Additional elderly-friendly improvements
-    css += """
+# Additional elderly-friendly improvements
+_FOOTER_CSS = """
 
 /* Improved spacing and readability */
 .container, .container-fluid {
@@ -376,293 +451,100 @@ body {
 }
 </style>"""
 
+_THEME_CSS = {'dark': _DARK_CSS, 'light': _LIGHT_CSS}
+
+
+_RE_CSS_COMMENT_OR_SPACE = re.compile(r'/\*.*?\*/|\s+', re.S)
+_RE_CSS_PUNCTUATION_SPACE = re.compile(r'\s*([{}:;,>])\s*')
+
+
+def _minify_css(css):
+    """Drop comments and collapse whitespace (spaces inside calc() are kept)"""
+    css = _RE_CSS_COMMENT_OR_SPACE.sub(lambda m: '' if m.group().startswith('/*') else ' ', css)
+    return _RE_CSS_PUNCTUATION_SPACE.sub(r'\1', css).strip()
+
+
+@lru_cache(maxsize=64)
+def _build_accessibility_css(font_size, theme):
+    """Assemble the (minified) CSS for one (font_size, theme) combination"""
+    return _minify_css("".join((
+        _BASE_CSS_TEMPLATE.format_map({'font_size': font_size}),
+        _THEME_CSS.get(theme, _LIGHT_CSS),
+        _FOOTER_CSS
+    )))
+
+
+def get_accessibility_css(settings):
+    """
+    Generate CSS based on accessibility settings optimized for elderly users.
+    """
+    try:
+        font_size = int(settings.get('font_size', 18))
+    except (ValueError, TypeError):
+        font_size = 18
+    # Anything but 'dark' renders the light theme; normalising keeps cache keys bounded
+    theme = 'dark' if settings.get('theme', 'light') == 'dark' else 'light'
+    css = _CSS_TABLE.get((font_size, theme))
+    if css is None:
+        # Outside the slider's 14-28px range (e.g. a hand-edited file)
+        css = _build_accessibility_css(font_size, theme)
     return css
 
 
-# Language text dictionary for the interface - COMPLETE VERSION
-INTERFACE_TEXTS = {
-    'en': {
-        'settings_title': 'Settings',
-        'text_size': 'Text Size',
-        'language': 'Language',
-        'display_mode': 'Display Mode',
-        'save_settings': 'Save My Settings',
-        'settings_saved': 'Settings saved successfully!',
-        'bright_background': 'Bright Background',
-        'dark_background': 'Dark Background',
-        'make_text_bigger': 'Make text bigger or smaller:',
-        'choose_language': 'Choose your preferred language:',
-        'choose_display': 'Choose how the screen looks:',
-        'preview_text': 'This is how your text will look. You can make it bigger or smaller using the slider above.',
-        'easy_bright_rooms': 'Easy to read in bright rooms',
-        'easier_night': 'Easier on the eyes at night',
-
-        # Navigation and common elements
-        'community_forum': 'Community Forum',
-        'calendar': 'Calendar',
-        'forum': 'Forum',
-        'volunteers': 'Volunteers',
-        'chatbot': 'AI Assistant',
-        'faq': 'FAQ',
-        'help': 'Help',
-        'settings': 'Settings',
-        'community_footer': 'Community Forum - Stay Connected',
-
-        # Forum-specific texts
-        'new_post': 'New Post',
-        'view_posts': 'View Posts',
-        'view_post': 'View Post',
-        'post_title': 'Post Title',
-        'post_content': 'Post Content',
-        'comments': 'comments',
-        'add_comment': 'Add Comment',
-        'edit_post': 'Edit Post',
-        'delete_post': 'Delete',
-        'submit': 'Submit',
-        'cancel': 'Cancel',
-        'by': 'Posted by',
-        'on': 'On',
-        'no_posts_yet': 'No posts yet. Be the first to post!',
-        'confirm_delete': 'Are you sure you want to delete this post?',
-
-        # Volunteer-specific texts
-        'volunteer_requests': 'Volunteer Requests',
-        'new_request': 'New Request',
-        'request_help': 'Request Help',
-        'offer_help': 'Offer Help',
-        'claim_request': 'Claim Request',
-        'requested_by': 'Requested by',
-        'claimed_by': 'Claimed by',
-
-        # General UI texts
-        'loading': 'Loading...',
-        'error': 'Error',
-        'success': 'Success',
-        'warning': 'Warning',
-        'info': 'Information',
-        'close': 'Close',
-        'back': 'Back',
-        'next': 'Next',
-        'previous': 'Previous',
-        'search': 'Search',
-        'filter': 'Filter',
-        'sort': 'Sort',
-        'date': 'Date',
-        'time': 'Time',
-        'author': 'Author',
-        'title': 'Title',
-        'description': 'Description',
-        'welcome': 'Welcome',
-        'logout': 'Logout',
-        'login': 'Login',
-        'home': 'Home',
-        'dashboard': 'Dashboard',
-        'events': 'Events',
-        'profile_settings': 'Profile Settings',
-        'security_settings': 'Security Settings',
-        'signed_up_events': 'Signed-up Events',
-        'admin_panel': 'Admin Panel',
-        'admin_dashboard': 'Admin Dashboard',
-        'user_management': 'User Management',
-        'create_user': 'Create User',
-        'volunteer_management': 'Volunteer Management',
-        'audit_logs': 'Audit Logs',
-        'export_users': 'Export Users',
-        'account_information': 'Your Account Information',
-        
-        # Home page translations
-        'welcome_back': 'Welcome back',
-        'what_would_you_like_to_do': 'What would you like to do today?',
-        'my_profile': 'My Profile',
-        'view_update_personal_info': 'View and update your personal information',
-        'view_account_statistics': 'View your account statistics and activity',
-        'manage_security_preferences': 'Manage passwords, 2FA, and security preferences',
-        'manage_users_system': 'Manage users and system settings',
-        'account_at_glance': 'Your Account at a Glance',
-        'account_status': 'Account Status',
-        'active': 'Active',
-        'member_since': 'Member Since',
-        'last_login': 'Last Login',
-        'first_login': 'This is your first login!',
-        'account_type': 'Account Type',
-        'administrator': 'Administrator',
-        'standard_user': 'Standard User',
-        'need_help': 'Need Help?',
-        'contact_support_message': 'If you have any questions or need assistance, please don\'t hesitate to contact our support team.',
-        'email_support': 'Email Support',
-        'call_support': 'Call Support',
-        'user_guide': 'User Guide',
-        
-        # Dashboard translations
-        'profile_details': 'Profile Details',
-        'name': 'Name',
-        'email': 'Email',
-        'age': 'Age',
-        'contact': 'Contact',
-        'not_set': 'Not set',
-        'update_profile': 'Update Profile',
-        'change_password': 'Change Password',
-        
-        # Volunteer translations
-        'send_help_share_location': 'Send Help (Share Location)',
-        'register_as_volunteer': 'Register as Volunteer',
-        'click_button_to_share_location': 'Click the button above to share your location and request help.',
-        'current_help_requests': 'Current Help Requests',
-        'loading_map': 'Loading map...',
-        
-        # Events translations
-        'exclusive_events': 'Exclusive Events',
-        'sign_up_now': 'Sign Up Now!',
-        'no_events_available': 'No events available at the moment.',
-        'confirm_signup': 'Are you sure you want to sign up for'
-    },
-    'zh': {
-        'settings_title': '设置',
-        'text_size': '文字大小',
-        'language': '语言',
-        'display_mode': '显示模式',
-        'save_settings': '保存设置',
-        'settings_saved': '设置保存成功！',
-        'bright_background': '明亮背景',
-        'dark_background': '深色背景',
-        'make_text_bigger': '调整文字大小：',
-        'choose_language': '选择您的首选语言：',
-        'choose_display': '选择屏幕显示方式：',
-        'preview_text': '这是您的文字显示效果。您可以使用上面的滑块来调整文字大小。',
-        'easy_bright_rooms': '适合明亮环境阅读',
-        'easier_night': '夜间阅读更舒适',
-
-        # Navigation and common elements
-        'community_forum': '社区论坛',
-        'calendar': '日历',
-        'forum': '论坛',
-        'volunteers': '志愿者',
-        'chatbot': 'AI助手',
-        'faq': '常见问题',
-        'help': '帮助',
-        'settings': '设置',
-        'community_footer': '社区论坛 - 保持联系',
-
-        # Forum-specific texts
-        'new_post': '新帖子',
-        'view_posts': '查看帖子',
-        'view_post': '查看帖子',
-        'post_title': '帖子标题',
-        'post_content': '帖子内容',
-        'comments': '评论',
-        'add_comment': '添加评论',
-        'edit_post': '编辑帖子',
-        'delete_post': '删除',
-        'submit': '提交',
-        'cancel': '取消',
-        'by': '发布者',
-        'on': '于',
-        'no_posts_yet': '暂无帖子。成为第一个发帖的人！',
-        'confirm_delete': '您确定要删除这个帖子吗？',
-
-        # Volunteer-specific texts
-        'volunteer_requests': '志愿者请求',
-        'new_request': '新请求',
-        'request_help': '请求帮助',
-        'offer_help': '提供帮助',
-        'claim_request': '认领请求',
-        'requested_by': '请求者',
-        'claimed_by': '认领者',
-
-        # General UI texts
-        'loading': '加载中...',
-        'error': '错误',
-        'success': '成功',
-        'warning': '警告',
-        'info': '信息',
-        'close': '关闭',
-        'back': '返回',
-        'next': '下一页',
-        'previous': '上一页',
-        'search': '搜索',
-        'filter': '筛选',
-        'sort': '排序',
-        'date': '日期',
-        'time': '时间',
-        'author': '作者',
-        'title': '标题',
-        'description': '描述',
-        'welcome': '欢迎',
-        'logout': '注销',
-        'login': '登录',
-        'home': '主页',
-        'dashboard': '仪表板',
-        'events': '活动',
-        'profile_settings': '个人设置',
-        'security_settings': '安全设置',
-        'signed_up_events': '已报名活动',
-        'admin_panel': '管理面板',
-        'admin_dashboard': '管理仪表板',
-        'user_management': '用户管理',
-        'create_user': '创建用户',
-        'volunteer_management': '志愿者管理',
-        'audit_logs': '审计日志',
-        'export_users': '导出用户',
-        'account_information': '您的账户信息',
-        
-        # Home page translations
-        'welcome_back': '欢迎回来',
-        'what_would_you_like_to_do': '您今天想做什么？',
-        'my_profile': '我的个人资料',
-        'view_update_personal_info': '查看和更新您的个人信息',
-        'view_account_statistics': '查看您的账户统计和活动',
-        'manage_security_preferences': '管理密码、双重验证和安全首选项',
-        'manage_users_system': '管理用户和系统设置',
-        'account_at_glance': '您的账户概览',
-        'account_status': '账户状态',
-        'active': '活跃',
-        'member_since': '成员自',
-        'last_login': '上次登录',
-        'first_login': '这是您的首次登录！',
-        'account_type': '账户类型',
-        'administrator': '管理员',
-        'standard_user': '标准用户',
-        'need_help': '需要帮助？',
-        'contact_support_message': '如果您有任何问题或需要帮助，请随时联系我们的支持团队。',
-        'email_support': '邮件支持',
-        'call_support': '电话支持',
-        'user_guide': '用户指南',
-        
-        # Dashboard translations
-        'profile_details': '个人详情',
-        'name': '姓名',
-        'email': '邮箱',
-        'age': '年龄',
-        'contact': '联系方式',
-        'not_set': '未设置',
-        'update_profile': '更新个人资料',
-        'change_password': '更改密码',
-        
-        # Volunteer translations
-        'send_help_share_location': '发送帮助（共享位置）',
-        'register_as_volunteer': '注册为志愿者',
-        'click_button_to_share_location': '点击上面的按钮来共享您的位置并请求帮助。',
-        'current_help_requests': '当前帮助请求',
-        'loading_map': '地图加载中...',
-        
-        # Events translations
-        'exclusive_events': '专属活动',
-        'sign_up_now': '立即报名！',
-        'no_events_available': '目前没有可用的活动。',
-        'confirm_signup': '您确定要报名参加'
-    }
-}
+# Every variant the settings form can produce, built once at import
+_CSS_TABLE = MappingProxyType({
+    (font_size, theme): _build_accessibility_css(font_size, theme)
+    for font_size in range(14, 29)
+    for theme in ('light', 'dark')
+})
+
+
+# Language text dictionary for the interface, loaded on first use
+INTERFACE_TEXTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'interface_texts.json')
+_interface_texts = None
+
+
+def get_interface_texts():
+    """
+    Get the {language: {key: text}} interface texts, reading the file once.
+    """
+    global _interface_texts
+    if _interface_texts is None:
+        with open(INTERFACE_TEXTS_FILE, 'rb') as f:
+            _interface_texts = _loads(f.read())
+    return _interface_texts
+
+
+def __getattr__(name):
+    # Keep settings.INTERFACE_TEXTS working without loading it at import
+    if name == 'INTERFACE_TEXTS':
+        return get_interface_texts()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def get_language_text(settings, key, texts=None):
     """
     Get text in the user's preferred language.
     """
-    if texts is None:
-        texts = INTERFACE_TEXTS
+    return make_translator(settings, texts)(key)
+
+
+def make_translator(settings, texts=None):
+    """
+    Bind a get_text(key) function to the user's language once per request.
+    Missing languages and untranslated keys fall back to English, then to the key.
+    """
+    interface_texts = get_interface_texts() if texts is None else texts
+    english = interface_texts.get('en', {})
+    language_texts = interface_texts.get(settings.get('language', 'en'), english)
+
+    def get_text(key):
+        text = language_texts.get(key)
+        if text is None:
+            text = english.get(key, key)
+        return text
 
-    language = settings.get('language', 'en')
-    return texts.get(language, texts.get('en', {})).get(key, key)
+    return get_text
 
 
 def validate_elderly_settings(settings):
@@ -671,7 +553,6 @@ def validate_elderly_settings(settings):
     Ensures settings are safe and appropriate.
     """
     # Ensure font size is not too small for elderly users
-    if settings.get('font_size', 18) < 16:
-        settings['font_size'] = 16
+    settings['font_size'] = max(16, settings.get('font_size', 18))
 
     return settings
\ No newline at end of file
@@ -2,19 +2,35 @@
 """
 simple_migration.py - Simple manual migration for Google OAuth columns
 
-This script manually adds the required columns without complex SQLAlchemy imports
+This script manually adds the required columns without complex SQLAlchemy imports.
+add_display_name_column and split_password_hashes are also run by migrate_db.py
+option 2, so either script brings an existing users table up to date, in any order.
 """
 
 import os
 import sys
+import json
+import hashlib
 import pymysql
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# Reused across calls so repeat migrations in one process skip the handshake
+_connection = None
+
 def get_db_connection():
     """Get direct MySQL connection"""
+    global _connection
+    if _connection is not None:
+        try:
+            # Reconnects transparently if the server dropped the idle session
+            _connection.ping(reconnect=True)
+            return _connection
+        except Exception:
+            _connection = None
+    
     try:
         connection = pymysql.connect(
             host=os.getenv('MYSQL_HOST', 'ivp-silversage.duckdns.org'),
@@ -25,8 +41,10 @@ def get_db_connection():
             port=3306,  # Add explicit port
             connect_timeout=10,  # Add timeout for remote connection
             read_timeout=10,
-            write_timeout=10
+            write_timeout=10,
+            autocommit=False
         )
+        _connection = connection
         return connection
     except Exception as e:
         print(f"❌ Database connection failed: {e}")
@@ -34,26 +52,66 @@ def get_db_connection():
         print(f"   Database: {os.getenv('MYSQL_DATABASE', 'flask_db')}")
         return None
 
+def close_db_connection():
+    """Close the shared connection"""
+    global _connection
+    if _connection is not None:
+        _connection.close()
+        _connection = None
+
+_SQL_COLUMN_EXISTS = """
+    SELECT 1 
+    FROM INFORMATION_SCHEMA.COLUMNS 
+    WHERE TABLE_SCHEMA = DATABASE() 
+    AND TABLE_NAME = %s 
+    AND COLUMN_NAME = %s
+    LIMIT 1
+"""
+
+_SQL_TABLE_COLUMNS = """
+    SELECT COLUMN_NAME 
+    FROM INFORMATION_SCHEMA.COLUMNS 
+    WHERE TABLE_SCHEMA = DATABASE() 
+    AND TABLE_NAME = %s
+"""
+
+_SQL_TABLE_EXISTS = """
+    SELECT 1 
+    FROM INFORMATION_SCHEMA.TABLES 
+    WHERE TABLE_SCHEMA = DATABASE() 
+    AND TABLE_NAME = %s
+    LIMIT 1
+"""
+
+_SQL_COLUMN_NOT_NULL = """
+    SELECT 1 
+    FROM INFORMATION_SCHEMA.COLUMNS 
+    WHERE TABLE_SCHEMA = DATABASE() 
+    AND TABLE_NAME = %s 
+    AND COLUMN_NAME = %s
+    AND IS_NULLABLE = 'NO'
+    LIMIT 1
+"""
+
 def check_column_exists(cursor, table_name, column_name):
     """Check if column exists"""
-    cursor.execute(f"""
-        SELECT COUNT(*) 
-        FROM INFORMATION_SCHEMA.COLUMNS 
-        WHERE TABLE_SCHEMA = DATABASE() 
-        AND TABLE_NAME = '{table_name}' 
-        AND COLUMN_NAME = '{column_name}'
-    """)
-    return cursor.fetchone()[0] > 0
+    cursor.execute(_SQL_COLUMN_EXISTS, (table_name, column_name))
+    return cursor.fetchone() is not None
+
+def check_column_not_null(cursor, table_name, column_name):
+    """Check if column is declared NOT NULL"""
+    cursor.execute(_SQL_COLUMN_NOT_NULL, (table_name, column_name))
+    return cursor.fetchone() is not None
+
+def get_existing_columns(cursor, table_name):
+    """Get the set of column names on a table"""
+    cursor.execute(_SQL_TABLE_COLUMNS, (table_name,))
+    return {row[0] for row in cursor.fetchall()}
 
 def check_table_exists(cursor, table_name):
     """Check if table exists"""
-    cursor.execute(f"""
-        SELECT COUNT(*) 
-        FROM INFORMATION_SCHEMA.TABLES 
-        WHERE TABLE_SCHEMA = DATABASE() 
-        AND TABLE_NAME = '{table_name}'
-    """)
-    return cursor.fetchone()[0] > 0
+    cursor.execute(_SQL_TABLE_EXISTS, (table_name,))
+    return cursor.fetchone() is not None
 
 def add_google_oauth_columns(cursor):
     """Add Google OAuth columns to users table"""
@@ -66,21 +124,65 @@ def add_google_oauth_columns(cursor):
         ('email_verified', 'BOOLEAN DEFAULT FALSE')
     ]
     
-    added_count = 0
+    # One metadata read and one ALTER, so the table is rebuilt at most once
+    existing_columns = get_existing_columns(cursor, 'users')
+    missing = [(name, definition) for name, definition in columns_to_add if name not in existing_columns]
     
-    for column_name, column_definition in columns_to_add:
-        if not check_column_exists(cursor, 'users', column_name):
-            try:
-                cursor.execute(f'ALTER TABLE users ADD COLUMN {column_name} {column_definition}')
-                print(f"  ✅ Added column: {column_name}")
-                added_count += 1
-            except Exception as e:
-                print(f"  ❌ Failed to add {column_name}: {e}")
-        else:
+    for column_name, _ in columns_to_add:
+        if column_name in existing_columns:
             print(f"  ℹ️ Column {column_name} already exists")
     
+    if not missing:
+        return 0
+    
+    try:
+        cursor.execute('ALTER TABLE users ' + ', '.join(
+            f'ADD COLUMN {name} {definition}' for name, definition in missing
+        ))
+        for column_name, _ in missing:
+            print(f"  ✅ Added column: {column_name}")
+        return len(missing)
+    except Exception as e:
+        print(f"  ⚠️ Combined ALTER failed ({e}), adding columns one at a time")
+    
+    added_count = 0
+    for column_name, column_definition in missing:
+        try:
+            cursor.execute(f'ALTER TABLE users ADD COLUMN {column_name} {column_definition}')
+            print(f"  ✅ Added column: {column_name}")
+            added_count += 1
+        except Exception as e:
+            print(f"  ❌ Failed to add {column_name}: {e}")
+    
     return added_count
 
+_SQL_BACKFILL_DISPLAY_NAME = """
+    UPDATE users SET display_name = COALESCE(NULLIF(CONCAT_WS(' ',
+        NULLIF(first_name, ''), NULLIF(last_name, '')), ''), username)
+    WHERE display_name IS NULL
+"""
+
+def add_display_name_column(cursor):
+    """Add the indexed users.display_name column and backfill rows written before it existed"""
+    print("🔍 Adding display_name column...")
+    
+    try:
+        if check_column_exists(cursor, 'users', 'display_name'):
+            # Earlier migrations created it as VARCHAR(100); first + ' ' + last needs 101
+            cursor.execute('ALTER TABLE users MODIFY COLUMN display_name VARCHAR(101)')
+            print("  ℹ️ Column display_name already exists")
+        else:
+            cursor.execute('ALTER TABLE users ADD COLUMN display_name VARCHAR(101), '
+                           'ADD INDEX ix_users_display_name (display_name)')
+            print("  ✅ Added column: display_name")
+        
+        backfilled = cursor.execute(_SQL_BACKFILL_DISPLAY_NAME)
+        print(f"  ✅ Backfilled display_name for {backfilled} users")
+        return backfilled
+    except Exception as e:
+        print(f"  ❌ Failed to add display_name: {e}")
+        return 0
+
 def create_two_factor_table(cursor):
     """Create two_factor_auth table"""
     print("🔍 Creating two_factor_auth table...")
@@ -92,7 +194,7 @@ def create_two_factor_table(cursor):
                     id INT AUTO_INCREMENT PRIMARY KEY,
                     user_id INT NOT NULL,
                     is_enabled BOOLEAN DEFAULT FALSE,
-                    backup_codes TEXT NULL,
+                    backup_codes JSON NULL,
                     temp_code VARCHAR(10) NULL,
                     temp_code_expires DATETIME NULL,
                     last_used DATETIME NULL,
@@ -110,6 +212,83 @@ def create_two_factor_table(cursor):
         print("  ℹ️ two_factor_auth table already exists")
         return False
 
+def convert_backup_codes_to_json(cursor):
+    """Convert legacy plaintext backup codes to hashed JSON entries"""
+    print("🔍 Converting backup codes to hashed JSON...")
+    
+    if not check_table_exists(cursor, 'two_factor_auth'):
+        print("  ℹ️ two_factor_auth table not found, skipping")
+        return 0
+    
+    try:
+        cursor.execute("SELECT id, backup_codes FROM two_factor_auth WHERE backup_codes IS NOT NULL")
+        updates = []
+        for row_id, raw in cursor.fetchall():
+            codes = json.loads(raw) if raw.startswith('[') else raw.split(',')
+            if codes and all(isinstance(code, dict) for code in codes):
+                continue  # Already converted
+            entries = [
+                {'h': hashlib.sha256(code.strip().encode('utf-8')).hexdigest(), 'used': False}
+                for code in codes if isinstance(code, str) and code.strip()
+            ]
+            updates.append((json.dumps(entries) if entries else None, row_id))
+        
+        if updates:
+            cursor.executemany("UPDATE two_factor_auth SET backup_codes = %s WHERE id = %s", updates)
+        cursor.execute('ALTER TABLE two_factor_auth MODIFY COLUMN backup_codes JSON NULL')
+        print(f"  ✅ Converted {len(updates)} backup code rows")
+        return len(updates)
+    except Exception as e:
+        print(f"  ❌ Failed to convert backup codes: {e}")
+        return 0
+
+def split_password_hashes(cursor):
+    """Split legacy hex salt+hash strings into raw password_salt/password_hash bytes"""
+    print("🔍 Splitting password hashes into binary salt/hash columns...")
+    
+    converted = 0
+    for table_name in ('users', 'password_history'):
+        if not check_table_exists(cursor, table_name):
+            continue
+        try:
+            if not check_column_exists(cursor, table_name, 'password_salt'):
+                cursor.execute(f'ALTER TABLE {table_name} ADD COLUMN password_salt VARBINARY(32) NULL')
+            
+            # Keep whatever nullability the column already has (password_history's is nullable)
+            null_clause = 'NOT NULL' if check_column_not_null(cursor, table_name, 'password_hash') else 'NULL'
+            
+            # Switch to a binary type first so the UNHEXed bytes aren't charset-checked
+            cursor.execute(f'ALTER TABLE {table_name} MODIFY COLUMN password_hash VARBINARY(256) {null_clause}')
+            
+            # '!'-prefixed rows were unusable (Google-only) passwords
+            converted += cursor.execute(f"""
+                UPDATE {table_name}
+                SET password_salt = NULL, password_hash = UNHEX(SUBSTRING(password_hash, 2))
+                WHERE LENGTH(password_hash) = 65 AND password_hash LIKE '!%'
+            """)
+            converted += cursor.execute(f"""
+                UPDATE {table_name}
+                SET password_salt = UNHEX(LEFT(password_hash, 64)),
+                    password_hash = UNHEX(SUBSTRING(password_hash, 65))
+                WHERE LENGTH(password_hash) = 128
+            """)
+            
+            # Anything still over 32 bytes matched neither legacy format; narrowing would
+            # fail in strict mode or truncate it otherwise, so leave the column wide
+            unmatched = cursor.execute(f'SELECT id FROM {table_name} WHERE LENGTH(password_hash) > 32')
+            cursor.fetchall()
+            if unmatched:
+                print(f"  ⚠️ {unmatched} {table_name} rows match neither legacy hash format; "
+                      f"fix or clear them and re-run to narrow password_hash to VARBINARY(32)")
+                continue
+            
+            cursor.execute(f'ALTER TABLE {table_name} MODIFY COLUMN password_hash VARBINARY(32) {null_clause}')
+            print(f"  ✅ {table_name} password hashes are binary")
+        except Exception as e:
+            print(f"  ❌ Failed to convert {table_name} password hashes: {e}")
+    
+    return converted
+
 def main():
     print("="*60)
     print("🚀 Simple Google OAuth & 2FA Migration")
@@ -121,56 +300,70 @@ def main():
         return False
     
     try:
-        cursor = connection.cursor()
-        
-        # Check if users table exists
-        if not check_table_exists(cursor, 'users'):
-            print("❌ Users table not found. Please run your main application first.")
-            return False
-        
-        print("✅ Database connection successful")
-        print("✅ Users table found")
-        
-        # Add Google OAuth columns
-        google_columns_added = add_google_oauth_columns(cursor)
-        
-        # Create 2FA table
-        tfa_table_created = create_two_factor_table(cursor)
-        
-        # Commit changes
-        connection.commit()
-        
-        # Summary
-        print("\n" + "="*40)
-        print("Migration Summary")
-        print("="*40)
-        
-        if google_columns_added > 0:
-            print(f"✅ Added {google_columns_added} Google OAuth columns")
-        else:
-            print("ℹ️ Google OAuth columns already existed")
-        
-        if tfa_table_created:
-            print("✅ Created two_factor_auth table")
-        else:
-            print("ℹ️ two_factor_auth table already existed")
-        
-        print("\n🎉 Migration completed successfully!")
-        print("\nNext steps:")
-        print("1. Add your Google Client ID and Secret to .env file")
-        print("2. Start your application: python main.py")
-        print("3. Test Google OAuth login")
-        
-        return True
-        
+        with connection.cursor() as cursor:
+            # Check if users table exists
+            if not check_table_exists(cursor, 'users'):
+                print("❌ Users table not found. Please run your main application first.")
+                return False
+            
+            print("✅ Database connection successful")
+            print("✅ Users table found")
+            
+            # Add Google OAuth columns
+            google_columns_added = add_google_oauth_columns(cursor)
+            
+            # Add and backfill display_name
+            add_display_name_column(cursor)
+            
+            # Create 2FA table
+            tfa_table_created = create_two_factor_table(cursor)
+            
+            # Convert legacy backup codes
+            backup_rows_converted = convert_backup_codes_to_json(cursor)
+            
+            # Convert hex password hashes to binary salt + hash
+            password_rows_converted = split_password_hashes(cursor)
+            
+            # Commit changes
+            connection.commit()
+            
+            # Summary
+            print("\n" + "="*40)
+            print("Migration Summary")
+            print("="*40)
+            
+            if google_columns_added > 0:
+                print(f"✅ Added {google_columns_added} Google OAuth columns")
+            else:
+                print("ℹ️ Google OAuth columns already existed")
+            
+            if tfa_table_created:
+                print("✅ Created two_factor_auth table")
+            else:
+                print("ℹ️ two_factor_auth table already existed")
+            
+            if backup_rows_converted > 0:
+                print(f"✅ Converted {backup_rows_converted} backup code rows to JSON")
+            
+            if password_rows_converted > 0:
+                print(f"✅ Converted {password_rows_converted} password hashes to binary")
+            
+            print("\n🎉 Migration completed successfully!")
+            print("\nNext steps:")
+            print("1. Add your Google Client ID and Secret to .env file")
+            print("2. Start your application: python main.py")
+            print("3. Test Google OAuth login")
+            
+            return True
+            
     except Exception as e:
         print(f"❌ Migration failed: {e}")
         connection.rollback()
         return False
-    finally:
-        cursor.close()
-        connection.close()
 
 if __name__ == '__main__':
-    success = main()
+    try:
+        success = main()
+    finally:
+        close_db_connection()
     sys.exit(0 if success else 1)
\ No newline at end of file
@@ -1,27 +1,24 @@
-import mysql.connector
+from contextlib import closing
+
+import pymysql
 
 def test_connection():
     try:
-        # Establish a connection to the database
-        connection = mysql.connector.connect(
+        # Establish a connection to the database; closing() guarantees cleanup on every path
+        with closing(pymysql.connect(
             host='ivp-silversage.duckdns.org',
             port=3306,
             user='flask_user',
             password='Silvers@ge123',
             database='flask_db'
-        )
-        
-        if connection.is_connected():
+        )) as connection, connection.cursor() as cursor:
             print("Connection successful")
-            cursor = connection.cursor()
             cursor.execute("SHOW TABLES")
             tables = cursor.fetchall()
-            print("Available tables:", [tables[0] for tables in tables])
-        
-        connection.close()
+            print("Available tables:", [table[0] for table in tables])
 
     except Exception as e:
         print("Connection failed:", e)
 
 if __name__ == "__main__":
-    test_connection()       
\ No newline at end of file
+    test_connection()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Regression test: wrong current passwords on /change-password must lock the account
+Run this from your project directory: python -m pytest test_password_lockout.py
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from flask import Flask
+from flask_login import LoginManager
+
+import auth as auth_module
+from models import db, User
+from security import flush_security_events
+
+PASSWORD = 'Correct-horse-1'
+
+@pytest.fixture
+def app(monkeypatch):
+    """Minimal app with just the auth blueprint on an in-memory SQLite database"""
+    app = Flask(__name__)
+    app.config.update(
+        TESTING=True,
+        SECRET_KEY='test-secret-key',
+        SQLALCHEMY_DATABASE_URI='sqlite://',
+        WTF_CSRF_ENABLED=False,
+    )
+    db.init_app(app)
+
+    login_manager = LoginManager()
+    login_manager.init_app(app)
+
+    @login_manager.user_loader
+    def load_user(user_id):
+        return db.session.get(User, int(user_id))
+
+    app.register_blueprint(auth_module.auth)
+    app.teardown_request(flush_security_events)
+
+    # The templates need the full app's context processors; the test only checks the database
+    monkeypatch.setattr(auth_module, 'render_template', lambda *args, **kwargs: '')
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def user_id(app):
+    user = User(username='elder', email='elder@example.com')
+    user.set_password(PASSWORD)
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+def test_failed_change_password_attempts_lock_account(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+        sess['_fresh'] = True
+
+    for _ in range(5):
+        response = client.post('/change-password', data={
+            'current_password': 'wrong-password',
+            'new_password': 'Another-pass-2',
+            'confirm_password': 'Another-pass-2',
+        })
+        assert response.status_code == 200
+
+    # Read back through a fresh session so only committed state is seen
+    db.session.remove()
+    user = db.session.get(User, user_id)
+    assert user.failed_login_attempts == 5
+    assert user.account_locked_until is not None
+
+    # Once locked, even the right password is refused
+    assert not user.check_password(PASSWORD)
@@ -4,59 +4,111 @@ Quick test script to verify your Flask routes are working
 Run this from your project directory: python test_routes.py
 """
 
+import io
+import json
 import sys
 import os
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from functools import lru_cache
+from operator import itemgetter
+from importlib.util import find_spec
+_HERE = os.path.dirname(os.path.abspath(__file__))
+if _HERE not in sys.path:
+    sys.path.insert(0, _HERE)
 
-def test_app_creation():
-    """Test if the Flask app can be created successfully"""
+# Methods Flask adds to every rule automatically; not worth listing
+_HIDDEN_METHODS = frozenset(('HEAD', 'OPTIONS'))
+
+@lru_cache(maxsize=1)
+def _get_app():
+    """Create the Flask app once per interpreter and reuse it on later calls"""
+    # Imported here so a broken import is still reported by test_app_creation
+    from __init__ import create_app
+    return create_app()
+
+# Routes the login flow depends on, mapped to the endpoint expected to serve them
+CRITICAL_ROUTES = {
+    '/': 'index',
+    '/login': 'auth.login',
+    '/register': 'auth.register',
+    '/logout': 'auth.logout',
+    '/dashboard': 'dashboard',
+}
+
+@lru_cache(maxsize=1)
+def _collect_routes():
+    """Collect (endpoint, methods, path) for every rule, sorted by path, plus the set of paths"""
+    app = _get_app()
+    with app.app_context():
+        routes = []
+        routes_append = routes.append
+        rule_paths = set()
+        for rule in app.url_map.iter_rules():
+            visible = rule.methods - _HIDDEN_METHODS
+            methods = ','.join(sorted(visible)) if len(visible) > 1 else next(iter(visible), '')
+            routes_append((rule.endpoint, methods, rule.rule))
+            rule_paths.add(rule.rule)
+    
+    # Sort routes by URL path
+    routes.sort(key=itemgetter(2))
+    return tuple(routes), frozenset(rule_paths)
+
+def _render(report):
+    """Print a route report built by test_app_creation"""
+    # Build the whole report in memory and hand it to stdout in one write
+    buf = io.StringIO()
+    w = buf.write
+    
+    w("\n📋 Registered Routes:\n")
+    w("-" * 50 + "\n")
+    for endpoint, methods, path in report['routes']:
+        w(f"{path:25} {methods:15} {endpoint}\n")
+    
+    # Check for specific routes we need
+    w("\n🔍 Checking Critical Routes:\n")
+    w("-" * 50 + "\n")
+    missing = report['missing']
+    for path, expected_endpoint in CRITICAL_ROUTES.items():
+        status = "❌" if path in missing else "✅"
+        w(f"{status} {path:15} -> {expected_endpoint}\n")
+    
+    sys.stdout.write(buf.getvalue())
+
+def test_app_creation(render=True):
+    """Test if the Flask app can be created successfully
+    
+    Returns {'routes': ..., 'missing': ...} on success and None on failure.
+    Pass render=False to get the report without printing it.
+    """
     try:
-        from __init__ import create_app
-        app = create_app()
+        routes, rule_paths = _collect_routes()
+        report = {'routes': routes, 'missing': CRITICAL_ROUTES.keys() - rule_paths}
         
-        print("✅ Flask app created successfully!")
+        if render:
+            print("✅ Flask app created successfully!")
+            _render(report)
         
-        with app.app_context():
-            print("\n📋 Registered Routes:")
-            print("-" * 50)
-            
-            routes = []
-            for rule in app.url_map.iter_rules():
-                methods = ','.join(sorted(rule.methods - {'HEAD', 'OPTIONS'}))
-                routes.append((rule.endpoint, methods, rule.rule))
-            
-            # Sort routes by URL path
-            routes.sort(key=lambda x: x[2])
-            
-            for endpoint, methods, path in routes:
-                print(f"{path:25} {methods:15} {endpoint}")
-            
-            # Check for specific routes we need
-            print("\n🔍 Checking Critical Routes:")
-            print("-" * 50)
-            
-            critical_routes = [
-                ('/', 'index'),
-                ('/login', 'auth.login'),
-                ('/register', 'auth.register'),
-                ('/logout', 'auth.logout'),
-                ('/dashboard', 'dashboard'),
-            ]
-            
-            for path, expected_endpoint in critical_routes:
-                found = any(rule.rule == path for rule in app.url_map.iter_rules())
-                status = "✅" if found else "❌"
-                print(f"{status} {path:15} -> {expected_endpoint}")
-            
-            return True
+        return report
             
     except ImportError as e:
         print(f"❌ Import Error: {e}")
         print("Make sure all your Python files are in the same directory")
-        return False
+        return None
     except Exception as e:
         print(f"❌ Error creating Flask app: {e}")
-        return False
+        return None
+
+def _try_import(module, loaded=sys.modules):
+    """Locate a module by name without executing it, returning any error instead of raising it"""
+    # Already-imported modules need no trip through the import machinery
+    if module in loaded:
+        return None
+    try:
+        # find_spec only resolves the finder/loader; the module body never runs
+        if find_spec(module) is None:
+            return ModuleNotFoundError(f"No module named '{module}'")
+        return None
+    except Exception as e:
+        return e
 
 def test_individual_modules():
     """Test if individual modules can be imported"""
@@ -66,18 +118,34 @@ def test_individual_modules():
     print("-" * 50)
     
     for module in modules:
-        try:
-            __import__(module)
+        e = _try_import(module)
+        if e is None:
             print(f"✅ {module}")
-        except ImportError as e:
+        elif isinstance(e, ImportError):
             print(f"❌ {module}: {e}")
-        except Exception as e:
+        else:
             print(f"⚠️ {module}: {e}")
 
 if __name__ == '__main__':
+    # Machine-readable dump for CI diffs; nothing else is written to stdout
+    if '--json' in sys.argv:
+        report = test_app_creation(render=False)
+        if report is None:
+            sys.exit(1)
+        sys.stdout.write(json.dumps({
+            'routes': [{'path': p, 'methods': m, 'endpoint': e} for e, m, p in report['routes']],
+            'missing': sorted(report['missing']),
+        }))
+        sys.exit(0)
+    
     print("🚀 Testing SilverSage Flask Application")
     print("=" * 60)
     
+    # Optionally byte-compile the project's modules so create_app() skips parse+compile
+    if '--precompile' in sys.argv:
+        import compileall
+        compileall.compile_dir(_HERE, maxlevels=0, quiet=1)
+    
     # Test module imports first
     test_individual_modules()
     